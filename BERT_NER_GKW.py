@@ -1,122 +1,179 @@
-import os
-import re
-import pandas as pd
-from itertools import combinations
-from transformers import pipeline
-import spacy
-
-# Load the BERT NER model from Hugging Face (mschiesser/ner-bert-german)
-ner_pipeline = pipeline("ner", model="mschiesser/ner-bert-german", tokenizer="mschiesser/ner-bert-german", grouped_entities=True)
-
-# Load the spaCy model (only once)
-nlp = spacy.load("de_core_news_sm")
+from word_distances import WordDistanceWriter
+from date_extraction import extract_dates
+from corpus import iter_documents, prefetch_documents
+from batched_inference import run_batched
+from model_registry import get_model, report_models
+from ner_backends import SCORE_THRESHOLD, bert_entities, result_columns
+from ner_cache import NERResultCache
+from bert_onnx import onnx_backend_name, onnx_model_path
+from result_writer import ResultWriter
+from pipeline_metrics import metrics, profile_block
+
+# BERT NER model from Hugging Face, loaded by the model registry on first use
+model_name = "mschiesser/ner-bert-german"
 
 # Define the root directory containing the Brief folders
 root_directory = ("C:/Users/Ahmad-PC/Desktop/GKW")
 
-# Define regex for Roman numeral months, abbreviated months, and full months
-roman_numeral_months = r'(I{1,3}|IV|V|VI|VII|VIII|IX|X|XI|XII)'
-
-# Abbreviated month names and full month names
-months_pattern = r'(Januar|Jan|Februar|Feb|März|Mär|April|Apr|Mai|Juni|Jun|Juli|Jul|August|Aug|September|Sep|Oktober|Okt|November|Nova|Dezember|Dez)'
-
-# General date pattern handling day, Roman numerals, months, and two/four-digit years
-date_pattern = rf'\b(\d{{1,2}}\.\s?({roman_numeral_months}|{months_pattern}|[0-9]{{1,2}})\s?\.\s?\d{{2,4}})\b'
-
-# Debugging function: Check if regex captures dates properly
-def extract_dates(text):
-    dates = re.findall(date_pattern, text)
-    if dates:
-        print(f"Extracted dates: {dates}")
-    else:
-        print("No dates found.")
-    return dates
-
-# Function to calculate word distances
-def calculate_word_distances(text):
-    words = text.split()
-    word_positions = {i: word for i, word in enumerate(words)}
-    word_distances = []
-    for (pos1, word1), (pos2, word2) in combinations(word_positions.items(), 2):
-        distance = abs(pos1 - pos2)
-        word_distances.append((pos1, pos2, distance))
-    return word_positions, word_distances
+# The corpus is read by a background thread that keeps up to prefetch_queue_size
+# documents ready, so file I/O overlaps with inference
+prefetch_reader = True
+prefetch_queue_size = 64
+
+# Word distance features are opt-in and written to their own output.
+# Only word pairs at most word_distance_window words apart are kept.
+compute_word_distances = False
+word_distance_window = 10
+word_distance_output_path = "C:/Users/Ahmad-PC/Desktop/NER/BERT-GKW-Word_Distances.csv"
+
+# Batched inference collects documents from the folder walk and sends them to
+# the pipeline inference_batch_size at a time instead of one call per file
+batched_inference = True
+inference_batch_size = 8
+
+# Set inference_runtime to "onnx" to run the model with ONNX Runtime instead of
+# PyTorch. The model is exported once to onnx_models/ and, with onnx_quantize,
+# quantized to INT8; the grouped entities and their offsets stay the same.
+# Requires optimum[onnxruntime]; bert_onnx_parity.py compares both runtimes.
+inference_runtime = "pytorch"
+onnx_quantize = True
+
+# Entities are cached in a SQLite file keyed by the SHA of the text, the model
+# and the score threshold, so a rerun only runs the model on changed texts.
+# Set result_cache_path to None to disable the cache, and change model_revision
+# after updating the model so its old entities are no longer used.
+result_cache_path = "C:/Users/Ahmad-PC/Desktop/NER/ner_cache.sqlite"
+model_revision = None
+
+# Results are appended to output_file_path every result_flush_every documents and
+# the finished documents are recorded in a checkpoint next to it, so a run
+# restarted after an interruption skips them. Once a run has finished, the next
+# run writes the output from scratch. Set resume_run to False to start over anyway.
+output_file_path = "C:/Users/Ahmad-PC/Desktop/NER/BERT-GKW-Result.csv"
+resume_run = True
+result_flush_every = 100
+
+# Stage timings are written to metrics_path at the end of the run. Set
+# profile_inference to "cprofile" or "py-spy" to profile the inference loop.
+metrics_path = "C:/Users/Ahmad-PC/Desktop/NER/metrics.json"
+profile_inference = None
+profile_output_path = "C:/Users/Ahmad-PC/Desktop/NER/inference.prof"
 
 # Function to process each text using BERT for NER
-def process_text(text, brief_id):
-    # Extract dates for debugging
-    dates = extract_dates(text)
-
-    # Calculate word distances
-    word_positions, word_distances = calculate_word_distances(text)
+def process_text(text, brief_id, entities):
+    # Extract dates with their positions
+    with metrics.stage("extract_dates"):
+        dates = extract_dates(text)
 
     all_results = []
 
-    # Apply the BERT NER model to the text
-    ner_results = ner_pipeline(text)
-
-    # Collect the found dates into the results
-    combined_date = ' '.join([d[0] for d in dates]).strip()
-    if combined_date:
-        for match in re.finditer(re.escape(combined_date), text):
-            start_pos = match.start()
-            all_results.append({
-                'Brief ID': brief_id,
-                'Type': 'DATE',
-                'Entity': combined_date,
-                'Score': 1.0,
-                'Position': start_pos,
-                'Distance': 0  # Distance is zero as this is a single entity
-            })
-
-    # Collect the BERT NER results with score > 0.90
-    for entity in ner_results:
-        if entity['score'] > 0.955:
-            all_results.append({
-                'Brief ID': brief_id,
-                'Type': entity['entity_group'],  # BERT returns 'entity_group' for grouped entities
-                'Entity': entity['word'],
-                'Score': entity['score'],
-                'Position': entity['start'],
-                'Distance': 0  # Distance is zero as this is a single entity
-            })
-
-    # Add word distances as a feature
-    for wd in word_distances:
+    # Add the found dates into the results, each with its own position
+    for date, start_pos, end_pos in dates:
         all_results.append({
             'Brief ID': brief_id,
-            'Type': 'WORD_DISTANCE',
-            'Entity': f'{word_positions[wd[0]]}-{word_positions[wd[1]]}',
+            'Type': 'DATE',
+            'Entity': date,
             'Score': 1.0,
-            'Position': wd[0],
-            'Distance': wd[2]
+            'Position': start_pos,
+            'Distance': 0  # Distance is zero as this is a single entity
         })
 
-    return all_results
-
-# Traverse through the Brief folders
-all_texts_results = []
-for brief_folder in os.listdir(root_directory):
-    brief_path = os.path.join(root_directory, brief_folder)
-    if os.path.isdir(brief_path):  # Check if it is a folder (Brief)
-        brief_id = brief_folder
-
-        # Process the single text file in each Brief folder
-        for filename in os.listdir(brief_path):
-            if filename.endswith(".txt"):
-                file_path = os.path.join(brief_path, filename)
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    text = file.read()
-                    all_texts_results.extend(process_text(text, brief_id))
-
-# Convert results to DataFrame
-results_df = pd.DataFrame(all_texts_results)
+    # Collect the BERT NER entities, already filtered to score > SCORE_THRESHOLD
+    for entity in entities:
+        all_results.append({
+            'Brief ID': brief_id,
+            'Type': entity['Type'],  # The 'entity_group' of the grouped entities
+            'Entity': entity['Entity'],
+            'Score': entity['Score'],
+            'Position': entity['Position'],
+            'Distance': 0  # Distance is zero as this is a single entity
+        })
 
-# Filter out WORD_DISTANCE types if needed
-results_df = results_df[results_df['Type'] != 'WORD_DISTANCE']
+    # Write word distances to their separate output if enabled
+    if word_distance_writer is not None:
+        word_distance_writer.write({'Brief ID': brief_id}, text)
 
-# Save DataFrame to CSV
-output_file_path = "C:/Users/Ahmad-PC/Desktop/NER/Result.csv"
-results_df.to_csv(output_file_path, index=False)
+    return all_results
 
-print(f"NER results saved to {output_file_path}")
+# Function to return the BERT NER pipeline of the selected runtime
+def load_pipeline():
+    if inference_runtime == "onnx":
+        return get_model("bert-onnx", onnx_model_path(model_name, onnx_quantize))
+    return get_model("bert", model_name)
+
+# Function to run the BERT NER model on a batch of texts and keep the entities of each text
+def run_ner_batch(texts):
+    ner_pipeline = load_pipeline()
+    return [bert_entities(ner_results) for ner_results in ner_pipeline(texts, batch_size=inference_batch_size)]
+
+# Function to yield (document, entities) for the documents that need the model
+def predict_documents(documents):
+    if batched_inference:
+        yield from run_batched(documents, run_ner_batch, inference_batch_size)
+    else:
+        for document in documents:
+            yield document, bert_entities(load_pipeline()(document[-1]))
+
+# Function to read the documents of the corpus, in a background thread if enabled
+def read_documents():
+    if prefetch_reader:
+        return prefetch_documents(root_directory, "gkw", prefetch_queue_size)
+    return iter_documents(root_directory, "gkw")
+
+# Function to check whether an earlier run finished the results and the word
+# distances of a document, so it can be skipped
+def is_done(document):
+    return result_writer.is_done(document) and (word_distance_writer is None or word_distance_writer.is_done(document))
+
+# Name of the results of this run, keying the cache and the checkpoints
+backend_name = onnx_backend_name(onnx_quantize) if inference_runtime == "onnx" else "bert"
+
+# Open the result output, resuming after the documents of an earlier run
+result_writer = ResultWriter(output_file_path, result_columns(['Brief ID'], True), resume=resume_run,
+                             flush_every=result_flush_every, run=f"{backend_name}-GKW").open()
+
+# Open the word distance output only when the feature is enabled
+word_distance_writer = None
+if compute_word_distances:
+    word_distance_writer = WordDistanceWriter(word_distance_output_path, ['Brief ID'], word_distance_window,
+                                              resume=resume_run, flush_every=result_flush_every,
+                                              run="GKW").open()
+
+# Only the documents that miss the result cache are sent to the model
+result_cache = None
+if result_cache_path is not None:
+    result_cache = NERResultCache(result_cache_path, backend_name, model_name, model_revision, SCORE_THRESHOLD)
+
+# Skip the documents finished by an earlier run
+documents = (document for document in read_documents() if not is_done(document))
+if result_cache is not None:
+    document_entities = result_cache.iter_cached(documents, predict_documents)
+else:
+    document_entities = predict_documents(documents)
+
+# The inference stage times the wait for the entities of the documents, per
+# model batch, so every document of a batch gets its share of the batch time
+with profile_block(profile_inference, profile_output_path):
+    for document, entities in metrics.timed_iter("inference", document_entities,
+                                                 batch_size=inference_batch_size if batched_inference else 1):
+        brief_id, text = document
+        rows = process_text(text, brief_id, entities)
+        # Documents whose word distances were missing already have their results
+        if not result_writer.is_done(document):
+            result_writer.write(document, rows)
+
+if result_cache is not None:
+    result_cache.close()
+    result_cache.report()
+
+if word_distance_writer is not None:
+    word_distance_writer.close(complete=True)
+    print(f"Word distances saved to {word_distance_output_path}")
+
+# Write the rows of the last documents and record the run as finished
+result_writer.close(complete=True)
+
+print(f"NER results saved to {output_file_path} ({result_writer.row_count} new rows)")
+report_models()
+metrics.report()
+metrics.write(metrics_path)
@@ -1,74 +1,75 @@
 import os
-import pandas as pd
-from PIL import Image as PILImage
-from wand.image import Image as WandImage
-import math
+from image_crop import crop_rows, write_failures, CropManifest, UniqueFilenameIndex
+from crop_metadata import read_metadata, list_files, add_crop_columns
+from pipeline_metrics import metrics
 
-def radians_to_degrees(radians):
-    return math.degrees(radians)
+# Function to turn the metadata rows into crop jobs for the process pool.
+# The metadata is read in chunks with only the needed columns, the paths and
+# absolute cuts are computed as vectorized columns and file existence is
+# checked against a single listing of base_image_path. Rows already in the
+# manifest are skipped. Output names come from an index of output_dir built
+# once, which also holds the names handed to pending jobs. Each name is
+# reserved in the manifest before the row is cropped, so a resumed run crops
+# an unfinished row to the same name instead of adding a new _N copy.
+def iter_crop_jobs(csv_file_path, start_row, base_image_path, output_dir, manifest, chunksize=None):
+    existing_files = list_files(base_image_path)
+    filename_index = UniqueFilenameIndex(output_dir)
+    # Reserved names whose crop was never written are not on disk, but stay taken
+    filename_index.taken.update(os.path.basename(path) for path in manifest.reserved.values())
+    extension = '.jpg'  # Change to your desired output format
+    done_rows = list(manifest.done)
 
-def generate_unique_filename(base_name, extension, output_dir):
-    counter = 1
-    new_filename = f"{base_name}{extension}"
-    while os.path.exists(os.path.join(output_dir, new_filename)):
-        new_filename = f"{base_name}_{counter}{extension}"
-        counter += 1
-    return new_filename
+    for chunk in read_metadata(csv_file_path, chunksize=chunksize):
+        chunk = chunk[chunk.index >= start_row]
+        chunk = chunk[~chunk.index.isin(done_rows)]
+        chunk = add_crop_columns(chunk, base_image_path, existing_files)
 
-def rotate_image_with_wand(input_path, output_temp_path, angle_radians):
-    angle_degrees = radians_to_degrees(angle_radians)  # Convert radians to degrees
-    with WandImage(filename=input_path) as img:
-        img.rotate(angle_degrees)
-        img.format = 'jpeg'  # Save as JPEG
-        img.save(filename=output_temp_path)
+        for filename in chunk.loc[~chunk['exists'], 'filename']:
+            print(f"Image file {filename} not found in directory.")
 
-def rotate_and_crop_image(input_path, output_path, angle_radians, left_cut, top_cut, right_cut, bottom_cut):
-    temp_path = 'temp_rotated_image.jpg'
-    try:
-        # Rotate image with Wand
-        rotate_image_with_wand(input_path, temp_path, angle_radians)
-
-        # Open the rotated image with PIL for cropping
-        with PILImage.open(temp_path) as img:
-            # Crop image using the provided coordinates
-            img = img.crop((left_cut, top_cut, img.width - right_cut, img.height - bottom_cut))
-            img.save(output_path)
-    except Exception as e:
-        print(f"Error processing image {input_path}: {e}")
-    finally:
-        # Ensure the temporary file is properly closed before attempting to delete it
-        try:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)  # Clean up the temporary file
-        except PermissionError as e:
-            print(f"Error removing temp file {temp_path}: {e}")
+        # Angle is in radians in the CSV
+        found = chunk[chunk['exists']]
+        for row in found[['base_name', 'input_path', 'angle', 'left_cut', 'top_cut', 'right_cut',
+                          'bottom_cut']].itertuples():
+            output_image_path = manifest.reserved_path(row.Index)
+            if output_image_path is None:
+                output_image_path = os.path.join(output_dir, filename_index.assign(row.base_name, extension))
+                manifest.reserve(row.Index, output_image_path)
+            yield (row.Index, row.input_path, output_image_path, row.angle, row.left_cut, row.top_cut,
+                   row.right_cut, row.bottom_cut)
 
 # Example usage with CSV
 csv_file_path = 'C:/Users/Ahmad-PC/Desktop/data-1720545468962.csv'
 base_image_path = 'C:/Users/Ahmad-PC/Desktop/downloaded_images/'  # Update with the base path where images are located
 output_dir = 'C:/Users/Ahmad-PC/Desktop/Cropped_Images/'  # Update with the output directory
 
-df = pd.read_csv(csv_file_path)
-
 start_row = 0  # Set this to the desired starting row index
 
-for index, row in df.iloc[start_row:].iterrows():
-    filename = row['filepath'].replace('/', '_')
-    input_image_path = os.path.join(base_image_path, filename)
+# Rows read from the metadata CSV at a time, None reads the whole file at once
+chunksize = 50000
+
+# Number of worker processes, 1 crops the rows in this process
+max_workers = os.cpu_count() or 1
+
+# Finished rows are recorded here, so an interrupted run resumes automatically
+manifest_path = os.path.join(output_dir, 'crop_manifest.csv')
+failures_path = os.path.join(output_dir, 'crop_failures.csv')
+
+# Stage timings of the run are written to metrics_path
+metrics_path = os.path.join(output_dir, 'crop_metrics.json')
+
+# Only run when executed as a script, so that the worker processes of the
+# process pool can import this module without starting another run
+if __name__ == "__main__":
+    os.makedirs(output_dir, exist_ok=True)
 
-    if os.path.exists(input_image_path):
-        base_name = os.path.splitext(filename)[0]
-        extension = '.jpg'  # Change to your desired output format
-        unique_filename = generate_unique_filename(base_name, extension, output_dir)
-        output_image_path = os.path.join(output_dir, unique_filename)
+    with CropManifest(manifest_path) as manifest:
+        failures = crop_rows(iter_crop_jobs(csv_file_path, start_row, base_image_path, output_dir, manifest, chunksize),
+                             max_workers, manifest)
 
-        angle_radians = row['angle']  # Angle is in radians in the CSV
-        left_cut = abs(row['west'])
-        top_cut = abs(row['north'])
-        right_cut = abs(row['east'])
-        bottom_cut = abs(row['south'])
+    if failures:
+        write_failures(failures, failures_path)
+        print(f"{len(failures)} rows failed, see {failures_path}")
 
-        rotate_and_crop_image(input_image_path, output_image_path, angle_radians, left_cut, top_cut, right_cut,
-                              bottom_cut)
-    else:
-        print(f"Image file {filename} not found in directory.")
\ No newline at end of file
+    metrics.report()
+    metrics.write(metrics_path)
@@ -1,118 +1,165 @@
 import os
-import re
-import pandas as pd
-from itertools import combinations
-import spacy
-
-# Load the spaCy German model
-nlp = spacy.load("de_core_news_sm")  # You can use "de_core_news_md" or "de_core_news_lg" for larger models
+from word_distances import WordDistanceWriter
+from date_extraction import extract_dates
+from corpus import iter_documents, prefetch_documents
+from spacy_batching import pipe_documents
+from model_registry import get_model, report_models
+from ner_backends import spacy_entities, result_columns
+from ner_cache import NERResultCache
+from result_writer import ResultWriter
+from pipeline_metrics import metrics, profile_block
+
+# spaCy German model, loaded by the model registry on first use with only the
+# components doc.ents needs. You can use "de_core_news_md" or "de_core_news_lg" for larger models
+model_name = "de_core_news_sm"
 
 # Define the root directory containing the BKW/Brief/Blätter/txt_files
 root_directory = ("C:/Users/Ahmad-PC/Desktop/BKW")
 
-# Define regex for Roman numeral months, abbreviated months, and full months
-roman_numeral_months = r'(I{1,3}|IV|V|VI|VII|VIII|IX|X|XI|XII)'
-
-# Abbreviated month names and full month names
-months_pattern = r'(Januar|Jan|Februar|Feb|März|Mär|April|Apr|Mai|Juni|Jun|Juli|Jul|August|Aug|September|Sep|Oktober|Okt|November|Nova|Dezember|Dez)'
-
-# General date pattern handling day, Roman numerals, months, and two/four-digit years
-date_pattern = rf'\b(\d{{1,2}}\.\s?({roman_numeral_months}|{months_pattern}|[0-9]{{1,2}})\s?\.\s?\d{{2,4}})\b'
-
-# Function to extract dates using regex
-def extract_dates(text):
-    dates = re.findall(date_pattern, text)
-    return dates
-
-# Function to calculate word distances
-def calculate_word_distances(text):
-    words = text.split()
-    word_positions = {i: word for i, word in enumerate(words)}
-    word_distances = []
-    for (pos1, word1), (pos2, word2) in combinations(word_positions.items(), 2):
-        distance = abs(pos1 - pos2)
-        word_distances.append((pos1, pos2, distance))
-    return word_positions, word_distances
+# The corpus is read by a background thread that keeps up to prefetch_queue_size
+# documents ready, so file I/O overlaps with inference
+prefetch_reader = True
+prefetch_queue_size = 64
+
+# Word distance features are opt-in and written to their own output.
+# Only word pairs at most word_distance_window words apart are kept.
+compute_word_distances = False
+word_distance_window = 10
+word_distance_output_path = "C:/Users/Ahmad-PC/Desktop/NER/SpaCy-BKW-Word_Distances.csv"
+
+# Streaming mode feeds the folder walk into nlp.pipe with pipe_batch_size
+# texts per batch spread over pipe_n_process worker processes
+streaming_pipe = True
+pipe_batch_size = 50
+pipe_n_process = os.cpu_count() or 1
+
+# Entities are cached in a SQLite file keyed by the SHA of the text, the model
+# and the score threshold, so a rerun only runs the model on changed texts.
+# Set result_cache_path to None to disable the cache, and change model_revision
+# after updating the model so its old entities are no longer used.
+result_cache_path = "C:/Users/Ahmad-PC/Desktop/NER/ner_cache.sqlite"
+model_revision = None
+
+# Results are appended to output_file_path every result_flush_every documents and
+# the finished documents are recorded in a checkpoint next to it, so a run
+# restarted after an interruption skips them. Once a run has finished, the next
+# run writes the output from scratch. Set resume_run to False to start over anyway.
+output_file_path = "C:/Users/Ahmad-PC/Desktop/NER/SpaCy-BKW-Result.csv"
+resume_run = True
+result_flush_every = 100
+
+# Stage timings are written to metrics_path at the end of the run. Set
+# profile_inference to "cprofile" or "py-spy" to profile the inference loop.
+metrics_path = "C:/Users/Ahmad-PC/Desktop/NER/metrics.json"
+profile_inference = None
+profile_output_path = "C:/Users/Ahmad-PC/Desktop/NER/inference.prof"
 
 # Function to process each text
-def process_text(text, brief_id, blätter_id):
-    # Extract dates for debugging
-    dates = extract_dates(text)
-
-    # Calculate word distances
-    word_positions, word_distances = calculate_word_distances(text)
-
-    doc = nlp(text)  # Use spaCy model to process the text
+def process_text(text, brief_id, blätter_id, entities):
+    # Extract dates with their positions
+    with metrics.stage("extract_dates"):
+        dates = extract_dates(text)
 
     all_results = []
 
-    # Add the found dates into the results
-    combined_date = ' '.join([d[0] for d in dates]).strip()
-    if combined_date:
-        for match in re.finditer(re.escape(combined_date), text):
-            start_pos = match.start()
-            all_results.append({
-                'Brief ID': brief_id,
-                'Blätter ID': blätter_id,
-                'Type': 'DATE',
-                'Entity': combined_date,
-                'Position': start_pos,
-                'Distance': 0
-            })
-
-    # Extract named entities from spaCy
-    for ent in doc.ents:
-        if ent.label_ in ['PER', 'ORG', 'LOC', 'MISC']:  # Relevant entities
-            all_results.append({
-                'Brief ID': brief_id,
-                'Blätter ID': blätter_id,
-                'Type': ent.label_,
-                'Entity': ent.text,
-                'Position': ent.start_char,
-                'Distance': 0
-            })
-
-    # Add word distances as a feature
-    for wd in word_distances:
+    # Add the found dates into the results, each with its own position
+    for date, start_pos, end_pos in dates:
         all_results.append({
             'Brief ID': brief_id,
             'Blätter ID': blätter_id,
-            'Type': 'WORD_DISTANCE',
-            'Entity': f'{word_positions[wd[0]]}-{word_positions[wd[1]]}',
-            'Position': wd[0],
-            'Distance': wd[2]
+            'Type': 'DATE',
+            'Entity': date,
+            'Position': start_pos,
+            'Distance': 0
         })
 
+    # Add the named entities from spaCy, already limited to PER, ORG, LOC and MISC
+    for entity in entities:
+        all_results.append({
+            'Brief ID': brief_id,
+            'Blätter ID': blätter_id,
+            'Type': entity['Type'],
+            'Entity': entity['Entity'],
+            'Position': entity['Position'],
+            'Distance': 0
+        })
+
+    # Write word distances to their separate output if enabled
+    if word_distance_writer is not None:
+        word_distance_writer.write({'Brief ID': brief_id, 'Blätter ID': blätter_id}, text)
+
     return all_results
 
-# Traverse through the Brief and Blätter folders
-all_texts_results = []
-for brief_folder in os.listdir(root_directory):
-    brief_path = os.path.join(root_directory, brief_folder)
-    if os.path.isdir(brief_path):  # Check if it is a folder (Brief)
-        brief_id = brief_folder
-
-        for blätter_folder in os.listdir(brief_path):
-            blätter_path = os.path.join(brief_path, blätter_folder)
-            if os.path.isdir(blätter_path):  # Check if it is a folder (Blätter)
-                blätter_id = blätter_folder
-
-                # Process all text files in the Blätter folder
-                for filename in os.listdir(blätter_path):
-                    if filename.endswith(".txt"):
-                        file_path = os.path.join(blätter_path, filename)
-                        with open(file_path, 'r', encoding='utf-8') as file:
-                            text = file.read()
-                            all_texts_results.extend(process_text(text, brief_id, blätter_id))
-
-# Convert results to DataFrame
-results_df = pd.DataFrame(all_texts_results)
-
-# Filter out WORD_DISTANCE types if needed
-results_df = results_df[results_df['Type'] != 'WORD_DISTANCE']
-
-# Save DataFrame to CSV
-output_file_path = "C:/Users/Ahmad-PC/Desktop/NER/Result.csv"
-results_df.to_csv(output_file_path, index=False)
-
-print(f"NER results saved to {output_file_path}")
+# Function to yield (document, entities) for the documents that need the model
+def predict_documents(documents):
+    nlp = get_model("spacy", model_name)
+    if streaming_pipe:
+        for document, doc in pipe_documents(nlp, documents, pipe_batch_size, pipe_n_process):
+            yield document, spacy_entities(doc)
+    else:
+        for document in documents:
+            yield document, spacy_entities(nlp(document[-1]))
+
+# Function to read the documents of the corpus, in a background thread if enabled
+def read_documents():
+    if prefetch_reader:
+        return prefetch_documents(root_directory, "bkw", prefetch_queue_size)
+    return iter_documents(root_directory, "bkw")
+
+# Function to check whether an earlier run finished the results and the word
+# distances of a document, so it can be skipped
+def is_done(document):
+    return result_writer.is_done(document) and (word_distance_writer is None or word_distance_writer.is_done(document))
+
+# Only run when executed as a script, so that the worker processes started by
+# nlp.pipe(n_process=...) can import this module without starting another run
+if __name__ == "__main__":
+    # Open the result output, resuming after the documents of an earlier run
+    result_writer = ResultWriter(output_file_path, result_columns(['Brief ID', 'Blätter ID'], False), resume=resume_run,
+                                 flush_every=result_flush_every, run="spacy-BKW").open()
+
+    # Open the word distance output only when the feature is enabled
+    word_distance_writer = None
+    if compute_word_distances:
+        word_distance_writer = WordDistanceWriter(word_distance_output_path, ['Brief ID', 'Blätter ID'], word_distance_window,
+                                                  resume=resume_run, flush_every=result_flush_every,
+                                                  run="BKW").open()
+
+    # Only the documents that miss the result cache are sent to the model
+    result_cache = None
+    if result_cache_path is not None:
+        result_cache = NERResultCache(result_cache_path, "spacy", model_name, model_revision, None)
+
+    # Skip the documents finished by an earlier run
+    documents = (document for document in read_documents() if not is_done(document))
+    if result_cache is not None:
+        document_entities = result_cache.iter_cached(documents, predict_documents)
+    else:
+        document_entities = predict_documents(documents)
+
+    # The inference stage times the wait for the entities of the documents, per
+    # model batch, so every document of a batch gets its share of the batch time
+    with profile_block(profile_inference, profile_output_path):
+        for document, entities in metrics.timed_iter("inference", document_entities,
+                                                     batch_size=pipe_batch_size if streaming_pipe else 1):
+            brief_id, blätter_id, text = document
+            rows = process_text(text, brief_id, blätter_id, entities)
+            # Documents whose word distances were missing already have their results
+            if not result_writer.is_done(document):
+                result_writer.write(document, rows)
+
+    if result_cache is not None:
+        result_cache.close()
+        result_cache.report()
+
+    if word_distance_writer is not None:
+        word_distance_writer.close(complete=True)
+        print(f"Word distances saved to {word_distance_output_path}")
+
+    # Write the rows of the last documents and record the run as finished
+    result_writer.close(complete=True)
+
+    print(f"NER results saved to {output_file_path} ({result_writer.row_count} new rows)")
+    report_models()
+    metrics.report()
+    metrics.write(metrics_path)
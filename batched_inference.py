@@ -0,0 +1,39 @@
+import time
+
+
+# Function to group an iterable into lists of at most batch_size items
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Function to run a model over documents in batches.
+# Each document is a tuple whose last element is the text; predict receives
+# the list of texts of a batch and returns one result per text. Yields
+# (document, result) pairs and reports the throughput in documents per second.
+def run_batched(documents, predict, batch_size, report=True):
+    total_documents = 0
+    total_seconds = 0.0
+    for batch in iter_batches(documents, batch_size):
+        start_time = time.perf_counter()
+        results = predict([document[-1] for document in batch])
+        elapsed = time.perf_counter() - start_time
+
+        total_documents += len(batch)
+        total_seconds += elapsed
+        if report:
+            print(f"Processed batch of {len(batch)} documents in {elapsed:.2f}s "
+                  f"({len(batch) / elapsed if elapsed else float('inf'):.2f} docs/s)")
+
+        for document, result in zip(batch, results):
+            yield document, result
+
+    if report and total_documents:
+        print(f"Processed {total_documents} documents in {total_seconds:.2f}s of inference "
+              f"({total_documents / total_seconds if total_seconds else float('inf'):.2f} docs/s, batch size {batch_size})")
@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import tempfile
+from image_crop import crop_to_file, crop_to_file_two_pass
+from synthetic_data import make_sample_image
+
+# Rotation and cuts used for every benchmark image, in the units of the metadata CSV
+angle_radians = 0.02
+left_cut, top_cut, right_cut, bottom_cut = 40, 30, 50, 60
+
+# Number of times every image is cropped by each implementation
+repeats = 5
+
+
+# Function to time a crop implementation on a list of images.
+# The implementations raise their errors, so failed crops are counted
+# separately and left out of the time per image.
+# Returns the seconds per cropped image and the number of failed crops.
+def time_crop(crop_function, image_paths, output_dir):
+    seconds = 0.0
+    cropped = 0
+    failures = 0
+    for _ in range(repeats):
+        for index, image_path in enumerate(image_paths):
+            output_path = os.path.join(output_dir, f"{crop_function.__name__}_{index}.jpg")
+            start_time = time.perf_counter()
+            try:
+                crop_function(image_path, output_path, angle_radians, left_cut, top_cut, right_cut, bottom_cut)
+            except Exception as e:
+                failures += 1
+                print(f"Error processing image {image_path}: {e}")
+                continue
+            seconds += time.perf_counter() - start_time
+            cropped += 1
+    return (seconds / cropped if cropped else None), failures
+
+
+# Function to format the time per image of a benchmark
+def format_seconds(seconds):
+    return f"{seconds * 1000:.1f} ms per image" if seconds is not None else "no image cropped"
+
+
+# Crop the images given on the command line, or a synthetic scan if none are given
+with tempfile.TemporaryDirectory() as work_dir:
+    image_paths = sys.argv[1:]
+    if not image_paths:
+        image_paths = [os.path.join(work_dir, "sample.jpg")]
+        make_sample_image(image_paths[0])
+
+    two_pass_seconds, two_pass_failures = time_crop(crop_to_file_two_pass, image_paths, work_dir)
+    single_pass_seconds, single_pass_failures = time_crop(crop_to_file, image_paths, work_dir)
+
+print(f"Two pass (Wand -> temp JPEG -> PIL): {format_seconds(two_pass_seconds)}, {two_pass_failures} failed")
+print(f"Single pass (in memory):             {format_seconds(single_pass_seconds)}, {single_pass_failures} failed")
+if two_pass_seconds is not None and single_pass_seconds is not None:
+    print(f"Speedup: {two_pass_seconds / single_pass_seconds:.2f}x")
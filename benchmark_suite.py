@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from corpus import iter_documents
+from date_extraction import extract_dates
+from word_distances import DEFAULT_MAX_WINDOW, calculate_word_distances
+from wossidia_api import iter_result_items
+from wossidia_hierarchy import index_node_items, build_hierarchy
+from bkw_export import iter_flattened_rows
+from synthetic_data import write_corpus, make_node_dumps, write_node_dumps, make_sample_image
+
+# Sizes of the synthetic data: corpus folders and words per text, nodes per
+# level of the WossiDiA dumps and the number and size of the scans
+SIZES = {
+    "small": {
+        'brief_count': 20, 'blätter_per_brief': 5, 'words_per_text': 300,
+        'person_count': 50, 'letters_per_person': 10, 'sheets_per_letter': 3, 'pages_per_sheet': 2,
+        'image_count': 2, 'image_width': 1500, 'image_height': 2000
+    },
+    "medium": {
+        'brief_count': 100, 'blätter_per_brief': 10, 'words_per_text': 400,
+        'person_count': 300, 'letters_per_person': 20, 'sheets_per_letter': 3, 'pages_per_sheet': 2,
+        'image_count': 4, 'image_width': 3000, 'image_height': 4000
+    },
+    "large": {
+        'brief_count': 400, 'blätter_per_brief': 10, 'words_per_text': 500,
+        'person_count': 1000, 'letters_per_person': 30, 'sheets_per_letter': 4, 'pages_per_sheet': 2,
+        'image_count': 8, 'image_width': 3000, 'image_height': 4000
+    }
+}
+
+# Rotation and cuts of the crop benchmark, in the units of the metadata CSV
+CROP_ARGUMENTS = (0.02, 40, 30, 50, 60)
+
+# Benchmarks slower than the baseline by more than this share are reported as regressions
+DEFAULT_TOLERANCE = 0.10
+
+# Directory the results are written to when no output path is given
+RESULTS_DIR = "benchmark_results"
+
+
+# Function to return the commit of the working tree, if it is a git checkout
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Function to time a benchmark.
+# setup runs before every repeat outside the timing and returns the argument
+# of run, which returns the number of items it processed. Returns the timing
+# record with the best and median seconds of the repeats.
+def measure(run, repeats, setup=None):
+    timings = []
+    items = 0
+    for _ in range(repeats):
+        argument = setup() if setup is not None else None
+        start_time = time.perf_counter()
+        items = run(argument) if setup is not None else run()
+        timings.append(time.perf_counter() - start_time)
+
+    best = min(timings)
+    return {
+        'seconds': best,
+        'median_seconds': statistics.median(timings),
+        'items': items,
+        'items_per_second': items / best if best else None,
+        'repeats': repeats
+    }
+
+
+# Function to extract the dates of every text, returning the number of texts
+def extract_all_dates(texts):
+    for text in texts:
+        extract_dates(text)
+    return len(texts)
+
+
+# Function to consume the word distance pairs of every text
+def count_distance_pairs(texts):
+    pairs = 0
+    for text in texts:
+        words, distances = calculate_word_distances(text, DEFAULT_MAX_WINDOW)
+        for first_positions, second_positions, distance in distances:
+            pairs += len(first_positions)
+    return pairs
+
+
+# Function to benchmark the text stages on a synthetic corpus of each layout
+def benchmark_texts(work_dir, size, repeats, backends, batch_size):
+    results = {}
+    for layout in ["bkw", "gkw"]:
+        root_directory = os.path.join(work_dir, layout)
+        write_corpus(root_directory, layout, size['brief_count'], size['blätter_per_brief'], size['words_per_text'])
+
+        results[f"read_corpus_{layout}"] = measure(lambda: sum(1 for _ in iter_documents(root_directory, layout)), repeats)
+        texts = [document[-1] for document in iter_documents(root_directory, layout)]
+
+        results[f"extract_dates_{layout}"] = measure(lambda: extract_all_dates(texts), repeats)
+        results[f"calculate_word_distances_{layout}"] = measure(lambda: count_distance_pairs(texts), repeats)
+
+        for backend in backends:
+            results[f"ner_{backend.name}_{layout}"] = benchmark_backend(backend, texts, repeats, batch_size)
+    return results
+
+
+# Function to benchmark a NER backend on the texts, after loading the model once
+def benchmark_backend(backend, texts, repeats, batch_size):
+    from batched_inference import iter_batches
+
+    backend.predict(texts[:1])  # Load the model outside the timing
+
+    def run():
+        for batch in iter_batches(texts, batch_size):
+            backend.predict(batch)
+        return len(texts)
+
+    return measure(run, repeats)
+
+
+# Function to benchmark parsing, building and flattening synthetic WossiDiA dumps
+def benchmark_hierarchy(work_dir, size, repeats):
+    dumps = make_node_dumps(size['person_count'], size['letters_per_person'], size['sheets_per_letter'],
+                            size['pages_per_sheet'])
+    data_paths = write_node_dumps(os.path.join(work_dir, "nodes"), dumps)
+    node_count = sum(len(data['result']) for data in dumps.values())
+
+    def parse_nodes():
+        return index_node_items({level_name: iter_result_items(data_path) for level_name, data_path in data_paths.items()})
+
+    results = {'parse_nodes': measure(lambda: sum(len(nodes) for nodes in parse_nodes().values()), repeats)}
+
+    # build_hierarchy attaches the children to the nodes, so every repeat gets a fresh index
+    def build(hierarchy):
+        build_hierarchy(hierarchy)
+        return node_count
+
+    results['build_hierarchy'] = measure(build, repeats, setup=parse_nodes)
+
+    full_hierarchy, orphans = build_hierarchy(parse_nodes())
+    results['flatten_rows'] = measure(lambda: sum(1 for _ in iter_flattened_rows(full_hierarchy)), repeats)
+    return results
+
+
+# Function to benchmark the rotate and crop of image_crop on synthetic scans.
+# crop_to_file is timed rather than rotate_and_crop_image, which only prints
+# its errors, so a failing crop stops the benchmark instead of being timed as
+# a fast success. Returns None when Wand/ImageMagick or PIL are not available.
+def benchmark_crop(work_dir, size, repeats):
+    try:
+        from image_crop import crop_to_file
+    except ImportError as error:
+        print(f"Skipping rotate_and_crop_image: {error}")
+        return None
+
+    image_paths = []
+    for index in range(size['image_count']):
+        image_paths.append(os.path.join(work_dir, f"scan_{index}.jpg"))
+        make_sample_image(image_paths[-1], size['image_width'], size['image_height'])
+
+    def run():
+        for index, image_path in enumerate(image_paths):
+            crop_to_file(image_path, os.path.join(work_dir, f"crop_{index}.jpg"), *CROP_ARGUMENTS)
+        return len(image_paths)
+
+    return measure(run, repeats)
+
+
+# Function to print the benchmarks and, with a baseline, their change against it.
+# Returns the names of the benchmarks that got slower than the tolerance.
+def report(results, baseline=None, tolerance=DEFAULT_TOLERANCE):
+    regressions = []
+    baseline_benchmarks = baseline['benchmarks'] if baseline is not None else {}
+    for name, result in results['benchmarks'].items():
+        line = f"{name:<36} {result['seconds'] * 1000:>10.1f} ms  {result['items']:>9} items"
+        if result['items_per_second'] is not None:
+            line += f"  {result['items_per_second']:>12.1f} items/s"
+
+        previous = baseline_benchmarks.get(name)
+        if previous is not None and previous['seconds']:
+            change = result['seconds'] / previous['seconds'] - 1
+            line += f"  {change:+.1%} vs {baseline.get('commit') or 'baseline'}"
+            if change > tolerance:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic BKW/GKW data.")
+    parser.add_argument("--size", choices=list(SIZES), default="small")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--backends", nargs="*", default=[], help="NER backends to benchmark (spacy, flair, bert)")
+    parser.add_argument("--batch-size", type=int, default=32, help="Number of texts per backend call")
+    parser.add_argument("--skip-crop", action="store_true", help="Do not benchmark rotate_and_crop_image")
+    parser.add_argument("--output", default=None, help="JSON file of the results, by default in benchmark_results/")
+    parser.add_argument("--compare", default=None, help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Slowdown against the baseline that counts as a regression")
+    args = parser.parse_args()
+
+    backends = []
+    if args.backends:
+        from ner_backends import BACKENDS
+        backends = [BACKENDS[name]() for name in args.backends]
+
+    size = SIZES[args.size]
+    benchmarks = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        benchmarks.update(benchmark_texts(work_dir, size, args.repeats, backends, args.batch_size))
+        benchmarks.update(benchmark_hierarchy(work_dir, size, args.repeats))
+        if not args.skip_crop:
+            crop_result = benchmark_crop(work_dir, size, args.repeats)
+            if crop_result is not None:
+                benchmarks['rotate_and_crop_image'] = crop_result
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'size': args.size,
+        'benchmarks': benchmarks
+    }
+
+    output_path = args.output
+    if output_path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output_path = os.path.join(RESULTS_DIR, f"{stamp}-{results['commit'] or 'nogit'}-{args.size}.json")
+    with open(output_path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        if baseline.get('size') != args.size:
+            print(f"Warning: baseline was run with size {baseline.get('size')}, this run with {args.size}")
+
+    regressions = report(results, baseline, args.tolerance)
+    print(f"Benchmark results saved to {output_path}")
+    if regressions:
+        print(f"{len(regressions)} benchmarks slower than the baseline: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
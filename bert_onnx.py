@@ -0,0 +1,90 @@
+import os
+import platform
+import re
+
+# Directory the exported ONNX models are kept in, one sub directory per model and precision
+DEFAULT_ONNX_DIR = "onnx_models"
+
+# File name of the quantized model written by the ORTQuantizer
+QUANTIZED_FILE_NAME = "model_quantized.onnx"
+
+
+# Function to return the backend name of the ONNX runtime at a precision,
+# used to keep the cached entities of the precisions apart
+def onnx_backend_name(quantize=True):
+    return "bert-onnx-int8" if quantize else "bert-onnx-fp32"
+
+
+# Function to return the dynamic quantization config of this CPU
+def quantization_config():
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return AutoQuantizationConfig.arm64(is_static=False, per_channel=False)
+    return AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+
+
+# Function to quantize the weights of the linear layers of an FP32 ONNX export
+# to INT8 (dynamic quantization, activations stay in float). The quantized
+# model and the tokenizer of onnx_dir are written to quantized_dir.
+# Returns quantized_dir.
+def quantize_model(onnx_dir, quantized_dir):
+    from optimum.onnxruntime import ORTQuantizer
+    from transformers import AutoTokenizer
+
+    quantizer = ORTQuantizer.from_pretrained(onnx_dir)
+    quantizer.quantize(save_dir=quantized_dir, quantization_config=quantization_config())
+    AutoTokenizer.from_pretrained(onnx_dir).save_pretrained(quantized_dir)
+    print(f"Quantized {onnx_dir} to INT8 in {quantized_dir}")
+    return quantized_dir
+
+
+# Function to export a Hugging Face token classification model to ONNX.
+# The FP32 export and the tokenizer are written to output_dir; with quantize
+# the export is also quantized to INT8 into output_dir/int8.
+# Returns the directory of the model to load.
+def export_model(model_name, output_dir, quantize=True):
+    from optimum.onnxruntime import ORTModelForTokenClassification
+    from transformers import AutoTokenizer
+
+    model = ORTModelForTokenClassification.from_pretrained(model_name, export=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    print(f"Exported {model_name} to ONNX in {output_dir}")
+    if not quantize:
+        return output_dir
+    return quantize_model(output_dir, os.path.join(output_dir, "int8"))
+
+
+# Function to return the directory of the ONNX export of a model, exporting
+# it on first use. A model_name that already is an exported directory is used
+# as it is; an FP32 export asked for INT8 is quantized into its int8 sub directory.
+def onnx_model_path(model_name, quantize=True, onnx_dir=DEFAULT_ONNX_DIR):
+    if os.path.isfile(os.path.join(model_name, QUANTIZED_FILE_NAME if quantize else "model.onnx")):
+        return model_name
+    if quantize and os.path.isfile(os.path.join(model_name, "model.onnx")):
+        quantized_dir = os.path.join(model_name, "int8")
+        if not os.path.isfile(os.path.join(quantized_dir, QUANTIZED_FILE_NAME)):
+            quantize_model(model_name, quantized_dir)
+        return quantized_dir
+
+    output_dir = os.path.join(onnx_dir, re.sub(r'[^\w.-]', '_', model_name))
+    model_dir = os.path.join(output_dir, "int8") if quantize else output_dir
+    model_file = QUANTIZED_FILE_NAME if quantize else "model.onnx"
+    if not os.path.isfile(os.path.join(model_dir, model_file)):
+        return export_model(model_name, output_dir, quantize)
+    return model_dir
+
+
+# Function to load the NER pipeline on an exported ONNX model.
+# The ONNX model runs in the same transformers pipeline as the PyTorch model,
+# so the grouped_entities aggregation and the 'start' offsets are unchanged.
+def load_bert_onnx(model_dir):
+    from optimum.onnxruntime import ORTModelForTokenClassification
+    from transformers import AutoTokenizer, pipeline
+
+    file_name = QUANTIZED_FILE_NAME if os.path.isfile(os.path.join(model_dir, QUANTIZED_FILE_NAME)) else "model.onnx"
+    model = ORTModelForTokenClassification.from_pretrained(model_dir, file_name=file_name)
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    return pipeline("ner", model=model, tokenizer=tokenizer, grouped_entities=True)
@@ -0,0 +1,258 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+from bert_onnx import onnx_model_path
+from corpus import LAYOUT_ID_COLUMNS, iter_documents
+from model_registry import get_model
+from ner_backends import SCORE_THRESHOLD, bert_entities
+from synthetic_data import WORDS, make_text
+
+# Labels of the tiny local model, in the scheme of the German NER models
+TINY_LABELS = ["O", "B-PER", "I-PER", "B-LOC", "I-LOC", "B-ORG", "I-ORG", "B-MISC", "I-MISC"]
+
+# Scale of the random classifier weights of the tiny model, so its scores
+# spread out and some entities pass the score threshold. The INT8 score
+# differences grow with the scale: 20 gives a largest difference of about 0.03
+# on the synthetic texts, within the INT8 score tolerance.
+TINY_CLASSIFIER_SCALE = 20.0
+
+# Columns a reference CSV needs besides the id columns of its layout
+REFERENCE_COLUMNS = ['Type', 'Entity', 'Score', 'Position']
+
+# Default minimum agreement and score tolerance of the FP32 and INT8 models
+FP32_MIN_AGREEMENT = 1.0
+FP32_SCORE_TOLERANCE = 0.001
+INT8_MIN_AGREEMENT = 0.95
+INT8_SCORE_TOLERANCE = 0.05
+
+
+# Function to build a tiny randomly initialized BERT token classifier with a
+# word piece vocabulary of the synthetic words, so the check runs offline.
+# Returns the directory of the saved model and tokenizer.
+def build_tiny_model(output_dir, seed=0):
+    import torch
+    from transformers import BertConfig, BertForTokenClassification, BertTokenizerFast
+
+    os.makedirs(output_dir, exist_ok=True)
+    characters = sorted({character for word in WORDS for character in word} | set("0123456789.,;:-()"))
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + sorted(set(WORDS)) + characters
+    vocab += [f"##{character}" for character in characters]
+    vocab_path = os.path.join(output_dir, "vocab.txt")
+    with open(vocab_path, 'w', encoding='utf-8') as file:
+        file.write("\n".join(vocab) + "\n")
+    tokenizer = BertTokenizerFast(vocab_file=vocab_path, do_lower_case=False)
+
+    config = BertConfig(
+        vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2, intermediate_size=64,
+        max_position_embeddings=512, num_labels=len(TINY_LABELS),
+        id2label=dict(enumerate(TINY_LABELS)), label2id={label: index for index, label in enumerate(TINY_LABELS)}
+    )
+    torch.manual_seed(seed)
+    model = BertForTokenClassification(config)
+    with torch.no_grad():
+        model.classifier.weight.mul_(TINY_CLASSIFIER_SCALE)
+    model.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    return output_dir
+
+
+# Function to compare the entities of one text.
+# Entities match on type, position and text. Returns the number of matched,
+# missing and extra entities and the largest score difference of the matches.
+def compare_entities(reference, candidate):
+    reference_by_key = {(entity['Type'], entity['Position'], entity['Entity']): entity for entity in reference}
+    candidate_by_key = {(entity['Type'], entity['Position'], entity['Entity']): entity for entity in candidate}
+    matched = reference_by_key.keys() & candidate_by_key.keys()
+    score_differences = [
+        abs(reference_by_key[key]['Score'] - candidate_by_key[key]['Score'])
+        for key in matched
+        if reference_by_key[key].get('Score') is not None and candidate_by_key[key].get('Score') is not None
+    ]
+    return {
+        'matched': len(matched),
+        'missing': len(reference_by_key.keys() - matched),
+        'extra': len(candidate_by_key.keys() - matched),
+        'max_score_difference': max(score_differences, default=0.0)
+    }
+
+
+# Function to add the comparison of one text to the totals
+def add_comparison(totals, comparison):
+    for key in ('matched', 'missing', 'extra'):
+        totals[key] = totals.get(key, 0) + comparison[key]
+    totals['max_score_difference'] = max(totals.get('max_score_difference', 0.0), comparison['max_score_difference'])
+    return totals
+
+
+# Function to return the share of the entities found by both sides
+def agreement(totals):
+    total = totals.get('matched', 0) + totals.get('missing', 0) + totals.get('extra', 0)
+    return totals.get('matched', 0) / total if total else 1.0
+
+
+# Function to read the non-date entities of a result CSV such as
+# Ergebnisse/BERT-BKW-Result.csv, keyed by the id columns of the layout.
+# Raises ValueError when the CSV is not a result CSV with scores of the
+# layout or has no entities to compare.
+def read_reference(csv_path, layout):
+    import pandas as pd
+
+    id_count = len(LAYOUT_ID_COLUMNS[layout])
+    # Some exports hold word pieces cut inside a multibyte character, which are
+    # read as replacement characters instead of failing the whole file
+    results = pd.read_csv(csv_path, dtype=str, keep_default_na=False, encoding='utf-8', encoding_errors='replace')
+    missing = [name for name in REFERENCE_COLUMNS if name not in results.columns]
+    if missing:
+        raise ValueError(f"{csv_path} has no {', '.join(missing)} column, expected a BERT or Flair result CSV")
+    # The id columns are taken by position, as their headers vary between the exports
+    id_names = list(results.columns[:list(results.columns).index('Type')])
+    if len(id_names) != id_count:
+        raise ValueError(f"{csv_path} has {len(id_names)} id columns, "
+                         f"expected {id_count} of a {layout.upper()} result CSV")
+    results = results[results['Type'] != 'DATE']
+
+    reference = {}
+    for row in results.to_dict('records'):
+        key = tuple(row[name] for name in id_names)
+        try:
+            entity = {'Type': row['Type'], 'Entity': row['Entity'], 'Score': float(row['Score']),
+                      'Position': int(row['Position'])}
+        except ValueError:
+            raise ValueError(f"{csv_path} has an invalid Score or Position in the row {row}")
+        reference.setdefault(key, []).append(entity)
+    if not reference:
+        raise ValueError(f"{csv_path} has no entities to compare")
+    return reference
+
+
+# Function to compare the entities of each document with the reference rows
+# of the same ids. Only entities above the score threshold of the scripts are
+# compared, like the rows of the result CSV. Returns the totals and the number
+# of documents that were found in the reference.
+def compare_with_reference(reference, results, threshold=SCORE_THRESHOLD):
+    totals = {}
+    compared = 0
+    for ids, entities in results.items():
+        if ids in reference:
+            compared += 1
+            kept = [entity for entity in entities if entity['Score'] > threshold]
+            add_comparison(totals, compare_entities(reference[ids], kept))
+    return totals, compared
+
+
+# Function to run the PyTorch and ONNX pipelines over the documents.
+# Returns the comparison totals and the entities of both runtimes per document ids.
+def compare_runtimes(torch_pipeline, onnx_pipeline, documents, threshold=0.0):
+    totals = {}
+    torch_results = {}
+    onnx_results = {}
+    for document in documents:
+        ids, text = tuple(document[:-1]), document[-1]
+        torch_entities = bert_entities(torch_pipeline(text), threshold)
+        onnx_entities = bert_entities(onnx_pipeline(text), threshold)
+        add_comparison(totals, compare_entities(torch_entities, onnx_entities))
+        torch_results[ids] = torch_entities
+        onnx_results[ids] = onnx_entities
+    return totals, torch_results, onnx_results
+
+
+# Function to return the synthetic documents of the check
+def synthetic_documents(count, seed=0):
+    rng = random.Random(seed)
+    return [(str(index), make_text(rng, rng.randint(20, 300))) for index in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the ONNX Runtime BERT backend against PyTorch.")
+    parser.add_argument("--model", default="mschiesser/ner-bert-german", help="Hugging Face model or local directory")
+    parser.add_argument("--tiny", action="store_true", help="Use a tiny randomly initialized local model (offline)")
+    parser.add_argument("--fp32", action="store_true", help="Check the FP32 export instead of the INT8 model")
+    parser.add_argument("--corpus", default=None, help="Corpus root to take the texts from, synthetic texts otherwise")
+    parser.add_argument("--layout", choices=sorted(LAYOUT_ID_COLUMNS), default="bkw")
+    parser.add_argument("--texts", type=int, default=50, help="Number of texts to compare")
+    parser.add_argument("--threshold", type=float, default=0.0,
+                        help="Score threshold of the compared entities, 0 compares every grouped entity")
+    parser.add_argument("--reference", default=None,
+                        help="Result CSV of an earlier run (e.g. Ergebnisse/BERT-BKW-Result.csv), needs --corpus")
+    parser.add_argument("--min-agreement", type=float, default=None,
+                        help="Minimum share of matching entities, by default 1.0 for FP32 and 0.95 for INT8")
+    parser.add_argument("--score-tolerance", type=float, default=None,
+                        help="Largest allowed score difference, by default 0.001 for FP32 and 0.05 for INT8")
+    parser.add_argument("--min-reference-agreement", type=float, default=None,
+                        help="Minimum share of the ONNX entities matching --reference, by default --min-agreement")
+    args = parser.parse_args()
+    if args.reference is not None and args.corpus is None:
+        parser.error("--reference needs the texts of --corpus")
+
+    quantize = not args.fp32
+    min_agreement = args.min_agreement
+    if min_agreement is None:
+        min_agreement = INT8_MIN_AGREEMENT if quantize else FP32_MIN_AGREEMENT
+    score_tolerance = args.score_tolerance
+    if score_tolerance is None:
+        score_tolerance = INT8_SCORE_TOLERANCE if quantize else FP32_SCORE_TOLERANCE
+    min_reference_agreement = args.min_reference_agreement
+    if min_reference_agreement is None:
+        min_reference_agreement = min_agreement
+
+    # The reference is read before the models run, so a bad file fails at once
+    reference = None
+    if args.reference is not None:
+        try:
+            reference = read_reference(args.reference, args.layout)
+        except (OSError, ValueError) as error:
+            parser.error(f"cannot use --reference: {error}")
+
+    if args.corpus is not None:
+        documents = []
+        for document in iter_documents(args.corpus, args.layout):
+            documents.append(document)
+            if reference is None and len(documents) >= args.texts:
+                break
+    else:
+        documents = synthetic_documents(args.texts)
+    if reference is not None and not any(tuple(document[:-1]) in reference for document in documents):
+        print(f"No text of {args.corpus} was found in {args.reference}")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        model_name = args.model
+        onnx_dir = "onnx_models"
+        if args.tiny:
+            model_name = build_tiny_model(os.path.join(work_dir, "tiny-bert"))
+            onnx_dir = os.path.join(work_dir, "onnx")
+
+        torch_pipeline = get_model("bert", model_name)
+        onnx_pipeline = get_model("bert-onnx", onnx_model_path(model_name, quantize, onnx_dir))
+
+        totals, torch_results, onnx_results = compare_runtimes(torch_pipeline, onnx_pipeline, documents,
+                                                               args.threshold)
+
+    runtime = "INT8" if quantize else "FP32"
+    passed = agreement(totals) >= min_agreement and totals.get('max_score_difference', 0.0) <= score_tolerance
+    print(f"PyTorch vs ONNX {runtime} on {len(documents)} texts: {totals.get('matched', 0)} matching entities, "
+          f"{totals.get('missing', 0)} missing, {totals.get('extra', 0)} extra "
+          f"({agreement(totals):.2%} agreement, max score difference {totals.get('max_score_difference', 0.0):.5f})")
+
+    # The ONNX entities must also match the results of the earlier PyTorch runs
+    if reference is not None:
+        reference_agreement = {}
+        for name, results in [("PyTorch", torch_results), (f"ONNX {runtime}", onnx_results)]:
+            reference_totals, compared = compare_with_reference(reference, results)
+            reference_agreement[name] = agreement(reference_totals)
+            print(f"{name} vs {args.reference} on {compared} texts: {reference_totals.get('matched', 0)} matching "
+                  f"entities, {reference_totals.get('missing', 0)} missing, {reference_totals.get('extra', 0)} extra "
+                  f"({reference_agreement[name]:.2%} agreement)")
+        if reference_agreement[f"ONNX {runtime}"] < min_reference_agreement:
+            print(f"ONNX {runtime} agrees with {args.reference} below {min_reference_agreement:.2%}")
+            passed = False
+
+    print("Parity check passed" if passed else
+          f"Parity check failed (minimum agreement {min_agreement:.2%}, score tolerance {score_tolerance})")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
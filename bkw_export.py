@@ -0,0 +1,119 @@
+import csv
+from wossidia_hierarchy import iter_pages
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # The Parquet export is only available when pyarrow is installed
+    pa = None
+    pq = None
+
+# Columns of the combined export, one row per page
+FIELDNAMES = [
+    'person_id', 'person_signature', 'person_imagedigital', 'person_wossig', 'person_info2', 'person_sig3',
+    'letter_id', 'letter_signature', 'letter_imagedigital', 'letter_wossig', 'letter_info2', 'letter_sig3',
+    'sheet_id', 'sheet_signature', 'sheet_imagedigital', 'sheet_wossig', 'sheet_info2', 'sheet_sig3',
+    'page_id', 'page_signature', 'page_imagedigital', 'page_imagedigital_hex', 'page_wossig', 'page_info2', 'page_sig3'
+]
+
+# Columns repeated on every page of a person, letter or sheet, stored as categoricals
+CATEGORICAL_PREFIXES = ("person_", "letter_", "sheet_")
+
+# Number of rows buffered per Parquet row group
+PARQUET_BATCH_SIZE = 10000
+
+
+# Fields of a person, letter or sheet node, in the order of FIELDNAMES
+ANCESTOR_FIELDS = ['id', 'signature', 'imagedigital', 'wossig', 'info2', 'sig3']
+
+
+# Function to return the column values of an ancestor node
+def ancestor_values(node):
+    return tuple(node[field] for field in ANCESTOR_FIELDS)
+
+
+# Function to yield one row per page as a tuple in the order of FIELDNAMES.
+# The tree is walked with the iterative iter_pages traversal, and the values
+# of each person, letter and sheet are built once and shared by all their pages.
+def iter_flattened_rows(full_hierarchy):
+    last_nodes = [None, None, None]
+    values = [(), (), ()]
+    for path in iter_pages(full_hierarchy):
+        for depth in range(3):
+            if path[depth] is not last_nodes[depth]:
+                last_nodes[depth] = path[depth]
+                values[depth] = ancestor_values(path[depth])
+
+        page = path[3]
+        page_imagedigital = page.get('imagedigital')
+        page_imagedigital_hex = hex(int(page_imagedigital))[2:] if page_imagedigital is not None else None  # remove '0x' prefix
+        yield values[0] + values[1] + values[2] + (
+            page['id'],
+            page['signature'],
+            page_imagedigital,
+            page_imagedigital_hex,
+            page['wossig'],
+            page['info2'],
+            page['sig3']
+        )
+
+
+# Schema of the Parquet export: person, letter and sheet columns are
+# dictionary encoded, page columns are plain strings
+def parquet_schema():
+    return pa.schema([
+        pa.field(name, pa.dictionary(pa.int32(), pa.string()) if name.startswith(CATEGORICAL_PREFIXES) else pa.string())
+        for name in FIELDNAMES
+    ])
+
+
+# Function to convert buffered rows into a record batch of the export schema
+def rows_to_batch(rows, schema):
+    columns = []
+    for index, field in enumerate(schema):
+        values = [None if row[index] is None else str(row[index]) for row in rows]
+        array = pa.array(values, type=pa.string())
+        if pa.types.is_dictionary(field.type):
+            array = array.dictionary_encode()
+        columns.append(array)
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+# Function to write the row tuples to a CSV file and/or a Parquet file in one pass.
+# Rows are written as they are produced, so memory stays flat: the CSV
+# receives every row immediately and Parquet buffers at most batch_size rows.
+# Returns the number of rows written.
+def export_rows(rows, csv_file=None, parquet_file=None, batch_size=PARQUET_BATCH_SIZE):
+    if parquet_file is not None and pa is None:
+        raise ImportError("pyarrow is required for the Parquet export")
+
+    csv_handle = None
+    parquet_writer = None
+    row_count = 0
+    try:
+        if csv_file is not None:
+            csv_handle = open(csv_file, 'w', newline='', encoding='utf-8')
+            csv_writer = csv.writer(csv_handle)
+            csv_writer.writerow(FIELDNAMES)
+        if parquet_file is not None:
+            schema = parquet_schema()
+            parquet_writer = pq.ParquetWriter(parquet_file, schema)
+
+        buffered = []
+        for row in rows:
+            row_count += 1
+            if csv_handle is not None:
+                csv_writer.writerow(row)
+            if parquet_writer is not None:
+                buffered.append(row)
+                if len(buffered) >= batch_size:
+                    parquet_writer.write_batch(rows_to_batch(buffered, schema))
+                    buffered = []
+        if parquet_writer is not None and buffered:
+            parquet_writer.write_batch(rows_to_batch(buffered, schema))
+    finally:
+        if csv_handle is not None:
+            csv_handle.close()
+        if parquet_writer is not None:
+            parquet_writer.close()
+    return row_count
@@ -0,0 +1,102 @@
+import os
+import queue
+import threading
+from pipeline_metrics import metrics
+
+# Id columns of the documents of each corpus layout:
+# BKW is Brief/Blätter/*.txt, GKW is Brief/*.txt
+LAYOUT_ID_COLUMNS = {
+    "bkw": ['Brief ID', 'Blätter ID'],
+    "gkw": ['Brief ID']
+}
+
+# Default number of documents read ahead of the consumer
+DEFAULT_QUEUE_SIZE = 64
+
+# Marker put on the queue once the reader thread has walked the whole corpus
+_DONE = object()
+
+
+# Function to read a text file of the corpus, timed as the read_file stage
+def read_text(file_path):
+    with metrics.stage("read_file") as counts:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            counts['bytes'] = os.fstat(file.fileno()).st_size
+            return file.read()
+
+
+# Function to return the sub folders of a folder as (name, path) pairs.
+# os.scandir reports the entry type from the directory listing itself, so no
+# extra os.path.isdir call per entry is needed.
+def list_folders(path):
+    with os.scandir(path) as entries:
+        return [(entry.name, entry.path) for entry in entries if entry.is_dir()]
+
+
+# Function to return the paths of the text files of a folder
+def list_text_files(path):
+    with os.scandir(path) as entries:
+        return [entry.path for entry in entries if entry.name.endswith(".txt") and entry.is_file()]
+
+
+# Function to traverse through the Brief (and Blätter) folders.
+# Yields (brief_id, blätter_id, text) for the BKW layout and (brief_id, text)
+# for the GKW layout, so the text is always the last element.
+def iter_documents(root_directory, layout="bkw"):
+    for brief_id, brief_path in list_folders(root_directory):
+        if layout == "gkw":
+            # Read the single text file in each Brief folder
+            for file_path in list_text_files(brief_path):
+                yield brief_id, read_text(file_path)
+            continue
+
+        # Read all text files in each Blätter folder
+        for blätter_id, blätter_path in list_folders(brief_path):
+            for file_path in list_text_files(blätter_path):
+                yield brief_id, blätter_id, read_text(file_path)
+
+
+# Function to read the corpus in a background thread while the caller works.
+# The reader fills a queue of at most queue_size documents, so file I/O
+# overlaps with inference and memory stays bounded by the queue size.
+# Yields the same tuples as iter_documents; errors of the reader are raised
+# in the caller, and closing the generator early stops the reader.
+def prefetch_documents(root_directory, layout="bkw", queue_size=DEFAULT_QUEUE_SIZE):
+    # A maxsize of 0 would make the queue unbounded
+    if queue_size < 1:
+        raise ValueError(f"queue_size must be at least 1, got {queue_size}")
+    documents = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    # Function to put an item on the queue unless the consumer has stopped
+    def put(item):
+        while not stop.is_set():
+            try:
+                documents.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read_corpus():
+        try:
+            for document in iter_documents(root_directory, layout):
+                if not put(document):
+                    return
+            put(_DONE)
+        except BaseException as error:
+            put(error)
+
+    reader = threading.Thread(target=read_corpus, name="corpus-reader", daemon=True)
+    reader.start()
+    try:
+        while True:
+            item = documents.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        reader.join()
@@ -0,0 +1,51 @@
+import os
+import pandas as pd
+
+# Columns of the data-*.csv metadata export that the crop and download scripts use
+METADATA_DTYPES = {
+    'filepath': 'object',
+    'angle': 'float64',
+    'west': 'float64',
+    'north': 'float64',
+    'east': 'float64',
+    'south': 'float64'
+}
+
+# Cut column of every side of the scan, in the order rotate_and_crop_image expects
+CUT_COLUMNS = {
+    'left_cut': 'west',
+    'top_cut': 'north',
+    'right_cut': 'east',
+    'bottom_cut': 'south'
+}
+
+
+# Function to read the metadata export with only the needed columns.
+# Yields DataFrames, a single one or one per chunk of chunksize rows for very
+# large exports. The row index keeps counting across chunks.
+def read_metadata(csv_file_path, columns=None, chunksize=None):
+    columns = list(METADATA_DTYPES) if columns is None else list(columns)
+    dtypes = {column: METADATA_DTYPES[column] for column in columns if column in METADATA_DTYPES}
+    if chunksize is None:
+        yield pd.read_csv(csv_file_path, usecols=columns, dtype=dtypes)
+    else:
+        yield from pd.read_csv(csv_file_path, usecols=columns, dtype=dtypes, chunksize=chunksize)
+
+
+# Function to list the files of a directory once, for bulk existence checks
+def list_files(directory):
+    return set(os.listdir(directory)) if os.path.isdir(directory) else set()
+
+
+# Function to add the derived crop columns to a metadata chunk as vectorized columns:
+# filename, base_name, input_path, exists and the absolute cuts left_cut,
+# top_cut, right_cut and bottom_cut.
+def add_crop_columns(df, base_image_path, existing_files):
+    df = df.copy()
+    df['filename'] = df['filepath'].str.replace('/', '_', regex=False)
+    df['base_name'] = df['filename'].str.replace(r'(?<=[^.])\.[^.]*$', '', regex=True)  # Like os.path.splitext
+    df['input_path'] = os.path.join(base_image_path, '') + df['filename']
+    df['exists'] = df['filename'].isin(existing_files)
+    for cut_column, side in CUT_COLUMNS.items():
+        df[cut_column] = df[side].abs()
+    return df
@@ -0,0 +1,53 @@
+import re
+
+# Define regex for Roman numeral months, abbreviated months, and full months
+roman_numeral_months = r'(I{1,3}|IV|V|VI|VII|VIII|IX|X|XI|XII)'
+
+# Abbreviated month names and full month names
+months_pattern = r'(Januar|Jan|Februar|Feb|März|Mär|April|Apr|Mai|Juni|Jun|Juli|Jul|August|Aug|September|Sep|Oktober|Okt|November|Nova|Dezember|Dez)'
+
+# General date pattern handling day, Roman numerals, months, and two/four-digit years
+date_pattern = rf'\b(\d{{1,2}}\.\s?({roman_numeral_months}|{months_pattern}|[0-9]{{1,2}})\s?\.\s?\d{{2,4}})\b'
+
+# Compiled once at import, so every text is scanned without re-interpreting the pattern
+date_regex = re.compile(date_pattern)
+
+
+# Function to extract dates in a single scan of the text.
+# Returns one (date, start, end) tuple per match with the offsets of the match.
+def extract_dates(text):
+    return [(match.group(1), match.start(1), match.end(1)) for match in date_regex.finditer(text)]
+
+
+# Pattern of the batch extraction: each match takes the text since the end of
+# the previous match as 'gap' and then a date, or runs to the end of the text.
+# The matches of a text are contiguous, so the offsets of every date follow
+# from the cumulative lengths of the matched groups.
+date_series_regex = re.compile(rf'(?P<gap>.*?)(?:(?P<date>{date_pattern})|\Z)', re.DOTALL)
+
+
+# Function to extract the dates of every text in a pandas Series with one
+# vectorized Series.str.extractall over the compiled pattern.
+# Returns a DataFrame with one row per date and the index label of its text
+# in the 'Text Index' column, followed by 'Entity', 'Start' and 'End'.
+def extract_dates_series(texts):
+    import pandas as pd
+
+    columns = ['Text Index', 'Entity', 'Start', 'End']
+    # Positional index, so texts with the same label are not counted together
+    matches = texts.reset_index(drop=True).str.extractall(date_series_regex)
+    if matches.empty:
+        return pd.DataFrame(columns=columns)
+
+    # Empty groups come back as missing values, so both lengths count them as 0
+    gap_lengths = matches['gap'].str.len().fillna(0).astype(int)
+    date_lengths = matches['date'].str.len().fillna(0).astype(int)
+    ends = (gap_lengths + date_lengths).groupby(level=0).cumsum()
+    found = matches['date'].notna()
+    positions = matches.index.get_level_values(0)[found]
+    return pd.DataFrame({
+        'Text Index': texts.index[positions],
+        'Entity': matches['date'][found].to_numpy(),
+        'Start': (ends - date_lengths)[found].to_numpy(),
+        'End': ends[found].to_numpy()
+    }, columns=columns)
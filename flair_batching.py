@@ -0,0 +1,44 @@
+import time
+from flair.splitter import SegtokSentenceSplitter
+from batched_inference import iter_batches
+
+# Sentence splitter that keeps the character offset of every sentence
+# in the original text as sentence.start_position
+splitter = SegtokSentenceSplitter()
+
+
+# Function to split a document into Flair sentences with their offsets
+def split_document(text):
+    return [sentence for sentence in splitter.split(text) if len(sentence) > 0]
+
+
+# Function to tag the sentences of a list of texts together.
+# The sentences are sorted by length so that every mini batch holds sentences
+# of similar length. Returns the tagged sentences of every text, whose span
+# offsets map back to the text via sentence.start_position.
+def tag_texts(tagger, texts, mini_batch_size=32):
+    text_sentences = [split_document(text) for text in texts]
+    pooled_sentences = [sentence for sentences in text_sentences for sentence in sentences]
+    pooled_sentences.sort(key=len, reverse=True)
+    if pooled_sentences:
+        tagger.predict(pooled_sentences, mini_batch_size=mini_batch_size)
+    return text_sentences
+
+
+# Function to tag the sentences of many documents together.
+# Documents are tuples whose last element is the text. The sentences of up to
+# pool_size documents are pooled and tagged with mini_batch_size.
+# Yields (document, sentences) where the sentences carry their 'ner' spans.
+def tag_documents(tagger, documents, mini_batch_size=32, pool_size=64, report=True):
+    for pool in iter_batches(documents, pool_size):
+        start_time = time.perf_counter()
+        document_sentences = tag_texts(tagger, [document[-1] for document in pool], mini_batch_size)
+        elapsed = time.perf_counter() - start_time
+
+        if report:
+            sentence_count = sum(len(sentences) for sentences in document_sentences)
+            print(f"Tagged {sentence_count} sentences from {len(pool)} documents in {elapsed:.2f}s "
+                  f"({len(pool) / elapsed if elapsed else float('inf'):.2f} docs/s)")
+
+        for document, sentences in zip(pool, document_sentences):
+            yield document, sentences
@@ -0,0 +1,252 @@
+import os
+import csv
+import math
+import time
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from PIL import Image as PILImage
+from wand.image import Image as WandImage
+from pipeline_metrics import metrics
+
+# JPEG quality of the cropped images, the PIL default the two pass path saved with
+JPEG_QUALITY = 75
+
+
+def radians_to_degrees(radians):
+    return math.degrees(radians)
+
+
+# Function to rotate and crop an image with a single decode and a single encode.
+# The image is rotated by the CSV angle in radians, the rotated canvas is
+# cropped by the west/north/east/south cuts in memory and the result is encoded
+# once. No temporary file is used, so several crops can run at the same time.
+def rotate_and_crop_image(input_path, output_path, angle_radians, left_cut, top_cut, right_cut, bottom_cut,
+                          quality=JPEG_QUALITY):
+    try:
+        crop_to_file(input_path, output_path, angle_radians, left_cut, top_cut, right_cut, bottom_cut, quality)
+    except Exception as e:
+        print(f"Error processing image {input_path}: {e}")
+
+
+# Function doing the work of rotate_and_crop_image, raising errors to the caller.
+# The crop is written to a temporary file next to the output and renamed into
+# place, so an interrupted run never leaves a partly written crop behind.
+def crop_to_file(input_path, output_path, angle_radians, left_cut, top_cut, right_cut, bottom_cut,
+                 quality=JPEG_QUALITY):
+    angle_degrees = radians_to_degrees(angle_radians)  # Convert radians to degrees
+    with WandImage(filename=input_path) as img:
+        img.rotate(angle_degrees)
+        # Drop the virtual canvas offset of the rotation, like the JPEG round trip did
+        img.reset_coords()
+        # Round the edges like PIL's Image.crop of the two pass path did
+        img.crop(left=round(left_cut), top=round(top_cut),
+                 right=round(img.width - right_cut), bottom=round(img.height - bottom_cut))
+        img.format = 'jpeg'
+        img.compression_quality = quality
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(output_path) or ".", suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                img.save(file=temp_file)
+            os.replace(temp_path, output_path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+
+# Persistent record of the metadata rows that were cropped.
+# The output name of a row is reserved in the manifest before its crop starts,
+# and the row is recorded again as done when the crop is written, so an
+# interrupted run resumes with the rows that are not done yet and crops them
+# to the names reserved for them. Manifests of older runs without the status
+# column only hold finished rows.
+class CropManifest:
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.done = {}
+        self.reserved = {}
+        self.lock = threading.Lock()
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', newline='', encoding='utf-8') as file:
+                for row in csv.reader(file):
+                    if len(row) not in (2, 3) or row[0] == 'row':
+                        continue
+                    status = row[2] if len(row) == 3 else 'done'
+                    if status == 'done':
+                        self.done[int(row[0])] = row[1]
+                    else:
+                        self.reserved[int(row[0])] = row[1]
+        manifest_dir = os.path.dirname(manifest_path)
+        if manifest_dir:
+            os.makedirs(manifest_dir, exist_ok=True)
+        is_new = not os.path.exists(manifest_path) or os.path.getsize(manifest_path) == 0
+        self.file = open(manifest_path, 'a', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        if is_new:
+            self.writer.writerow(['row', 'output_path', 'status'])
+            self.file.flush()
+
+    # Function to return the output path reserved for a row by an earlier run, if any
+    def reserved_path(self, row_index):
+        return self.reserved.get(row_index)
+
+    # Function to reserve the output path of a row before it is cropped
+    def reserve(self, row_index, output_path):
+        with self.lock:
+            self.reserved[row_index] = output_path
+            self.writer.writerow([row_index, output_path, 'reserved'])
+            self.file.flush()
+
+    def record(self, row_index, output_path):
+        with self.lock:
+            self.done[row_index] = output_path
+            self.writer.writerow([row_index, output_path, 'done'])
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# In-memory index of the file names in an output directory.
+# The directory is listed once; every name handed out is added to the index,
+# and the next free _N suffix of each base name is remembered, so assigning a
+# name costs amortized O(1) and never touches the filesystem.
+class UniqueFilenameIndex:
+    def __init__(self, output_dir):
+        self.taken = set(os.listdir(output_dir)) if os.path.isdir(output_dir) else set()
+        self.next_counter = {}
+
+    # Function to return the first free name of base_name, base_name_1, base_name_2, ...
+    def assign(self, base_name, extension):
+        new_filename = f"{base_name}{extension}"
+        if new_filename in self.taken:
+            counter = self.next_counter.get((base_name, extension), 1)
+            new_filename = f"{base_name}_{counter}{extension}"
+            while new_filename in self.taken:
+                counter += 1
+                new_filename = f"{base_name}_{counter}{extension}"
+            self.next_counter[(base_name, extension)] = counter + 1
+        self.taken.add(new_filename)
+        return new_filename
+
+
+# Function to crop a single job in a worker process.
+# A job is (row_index, input_path, output_path, angle_radians, left_cut,
+# top_cut, right_cut, bottom_cut). Returns (row_index, output_path, error, seconds)
+# where error is None when the crop succeeded.
+def crop_job(job):
+    row_index, input_path, output_path = job[:3]
+    start_time = time.perf_counter()
+    try:
+        crop_to_file(input_path, output_path, *job[3:])
+    except Exception as e:
+        return row_index, output_path, f"{type(e).__name__}: {e}", time.perf_counter() - start_time
+    return row_index, output_path, None, time.perf_counter() - start_time
+
+
+# Function to crop many jobs on a process pool.
+# Finished rows are recorded in the manifest as soon as they complete and
+# failures are collected as (row_index, input_path, error) instead of only
+# being printed. With max_workers of 1 the jobs run in this process.
+def crop_rows(jobs, max_workers=None, manifest=None, progress_every=100):
+    failures = []
+    input_paths = {}
+    finished = 0
+    start_time = time.perf_counter()
+
+    def handle_result(result):
+        nonlocal finished
+        row_index, output_path, error, seconds = result
+        if error is None:
+            finished += 1
+            metrics.record("crop", seconds, 1, os.path.getsize(output_path))
+            if manifest is not None:
+                manifest.record(row_index, output_path)
+            if progress_every and finished % progress_every == 0:
+                elapsed = time.perf_counter() - start_time
+                print(f"Cropped {finished} images in {elapsed:.1f}s ({finished / elapsed:.2f} images/s)")
+        else:
+            failures.append((row_index, input_paths.get(row_index), error))
+            print(f"Error processing image {input_paths.get(row_index)}: {error}")
+
+    if max_workers == 1:
+        for job in jobs:
+            input_paths[job[0]] = job[1]
+            handle_result(crop_job(job))
+    else:
+        # At most 2 * max_workers crops are queued at any time, so the jobs may be
+        # a lazy generator over the whole metadata CSV and finished rows are
+        # recorded while later rows are still being read
+        window = 2 * (max_workers or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            pending = set()
+            for job in jobs:
+                if len(pending) >= window:
+                    completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        handle_result(future.result())
+                input_paths[job[0]] = job[1]
+                pending.add(executor.submit(crop_job, job))
+            for future in as_completed(pending):
+                handle_result(future.result())
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Cropped {finished} images with {len(failures)} failures in {elapsed:.1f}s")
+    return failures
+
+
+# Function to write the collected failures to a CSV file
+def write_failures(failures, failures_path):
+    with open(failures_path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['row', 'input_path', 'error'])
+        writer.writerows(failures)
+
+
+def rotate_image_with_wand(input_path, output_temp_path, angle_radians):
+    angle_degrees = radians_to_degrees(angle_radians)  # Convert radians to degrees
+    with WandImage(filename=input_path) as img:
+        img.rotate(angle_degrees)
+        img.format = 'jpeg'  # Save as JPEG
+        img.save(filename=output_temp_path)
+
+
+# Previous two pass implementation, rotating with Wand into a temporary JPEG
+# and cropping that file with PIL. Kept as the baseline of benchmark_crop.py.
+def rotate_and_crop_image_two_pass(input_path, output_path, angle_radians, left_cut, top_cut, right_cut, bottom_cut,
+                                   temp_path='temp_rotated_image.jpg'):
+    try:
+        crop_to_file_two_pass(input_path, output_path, angle_radians, left_cut, top_cut, right_cut, bottom_cut,
+                              temp_path)
+    except Exception as e:
+        print(f"Error processing image {input_path}: {e}")
+
+
+# Function doing the work of rotate_and_crop_image_two_pass, raising errors to the caller
+def crop_to_file_two_pass(input_path, output_path, angle_radians, left_cut, top_cut, right_cut, bottom_cut,
+                          temp_path='temp_rotated_image.jpg'):
+    try:
+        # Rotate image with Wand
+        rotate_image_with_wand(input_path, temp_path, angle_radians)
+
+        # Open the rotated image with PIL for cropping
+        with PILImage.open(temp_path) as img:
+            # Crop image using the provided coordinates
+            img = img.crop((left_cut, top_cut, img.width - right_cut, img.height - bottom_cut))
+            img.save(output_path)
+    finally:
+        # Ensure the temporary file is properly closed before attempting to delete it
+        try:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)  # Clean up the temporary file
+        except PermissionError as e:
+            print(f"Error removing temp file {temp_path}: {e}")
@@ -0,0 +1,292 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image as PILImage
+from wossidia_hierarchy import iter_pages
+from pipeline_metrics import metrics
+
+# Size of the chunks a download is streamed to disk in
+CHUNK_SIZE = 64 * 1024
+
+# Start and end of image markers of a JPEG file
+JPEG_SOI = b'\xff\xd8'
+JPEG_EOI = b'\xff\xd9'
+
+# URL of the working scan of a page in the WossiDiA digipool
+BKW_IMAGE_URL = "https://digipool.wossidia.de/{hex_value}/working"
+
+
+# Function to create a session whose connection pool is shared by all workers
+def make_session(pool_size=16, retries=2):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Function to convert the imagedigital number of a page to its hex value
+def imagedigital_hex(imagedigital):
+    return hex(int(imagedigital))[2:] if imagedigital is not None else None  # remove '0x' prefix
+
+
+# Function to list the (url, image_path) download jobs of the page hierarchy.
+# Images keep the images/{letter_id}/{sheet_id}/{hex}.jpg layout.
+def bkw_image_jobs(full_hierarchy, image_root="images", url_template=BKW_IMAGE_URL):
+    for person, letter, sheet, page in iter_pages(full_hierarchy):
+        hex_value = imagedigital_hex(page.get('imagedigital'))
+        if hex_value:
+            image_path = os.path.join(image_root, str(letter['id']), str(sheet['id']), f"{hex_value}.jpg")
+            yield url_template.format(hex_value=hex_value), image_path
+
+
+# Persistent record of every downloaded file.
+# Entries are appended as JSON lines, one per finished or failed download, and
+# the last entry of a path wins when the manifest is loaded again. Each entry
+# holds the url, local path, size, SHA-256 hash and the ETag/Last-Modified
+# validators of the response.
+class DownloadManifest:
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.entries = {}
+        self.lock = threading.Lock()
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A line cut off by an interrupted run
+                    self.entries[entry['path']] = entry
+        manifest_dir = os.path.dirname(manifest_path)
+        if manifest_dir:
+            os.makedirs(manifest_dir, exist_ok=True)
+        self.file = open(manifest_path, 'a', encoding='utf-8')
+
+    def get(self, image_path):
+        return self.entries.get(image_path)
+
+    # Function to check that a path was completed and the file is still intact on disk
+    def is_complete(self, image_path):
+        entry = self.entries.get(image_path)
+        if entry is None or entry.get('status') != 'done':
+            return False
+        try:
+            return os.path.getsize(image_path) == entry['size']
+        except OSError:
+            return False
+
+    def record(self, entry):
+        entry['time'] = time.time()
+        with self.lock:
+            self.entries[entry['path']] = entry
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Function to build the conditional request headers of a completed entry
+def conditional_headers(entry):
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+# Function to return the size and SHA-256 hash of a file on disk
+def file_sha256(path):
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+
+# Function to add a file downloaded before the manifest existed to the manifest.
+# The file is only taken over when it is a complete, decodable image.
+# Returns True when the file was recorded as done.
+def seed_manifest(manifest, url, image_path):
+    if not os.path.isfile(image_path):
+        return False
+    try:
+        verify_image(image_path)
+        size, sha256 = file_sha256(image_path)
+    except OSError:
+        return False
+    manifest.record({'url': url, 'path': image_path, 'status': 'done', 'size': size, 'sha256': sha256,
+                     'etag': None, 'last_modified': None, 'seeded': True})
+    return True
+
+
+# Function to download a single image with the shared session.
+# With a manifest, files that were completed before and are intact on disk are
+# skipped, or revalidated with a conditional request when revalidate is set.
+# Files already on disk without a manifest entry (an image tree synced before
+# the manifest) are verified and recorded instead of being fetched again.
+# Returns the status ('downloaded', 'skipped' or 'not_modified') and the bytes written.
+def download_image(session, url, image_path, timeout=10, manifest=None, revalidate=False):
+    headers = {}
+    if manifest is not None and manifest.get(image_path) is None and seed_manifest(manifest, url, image_path):
+        return 'skipped', 0
+    if manifest is not None and manifest.is_complete(image_path):
+        entry = manifest.get(image_path)
+        if not revalidate:
+            return 'skipped', 0
+        headers = conditional_headers(entry)
+        if not headers:
+            return 'skipped', 0
+
+    image_dir = os.path.dirname(image_path) or "."
+    os.makedirs(image_dir, exist_ok=True)
+    try:
+        with session.get(url, timeout=timeout, headers=headers, stream=True) as response:
+            if response.status_code == 304:
+                return 'not_modified', 0
+            response.raise_for_status()
+            size, sha256 = stream_to_file(response, image_dir, image_path)
+    except (requests.exceptions.RequestException, OSError) as e:
+        if manifest is not None:
+            manifest.record({'url': url, 'path': image_path, 'status': 'failed', 'error': str(e)})
+        raise
+
+    if manifest is not None:
+        manifest.record({
+            'url': url,
+            'path': image_path,
+            'status': 'done',
+            'size': size,
+            'sha256': sha256,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified')
+        })
+    return 'downloaded', size
+
+
+# Function to stream a response into a temporary file next to the image.
+# The file is checked to be a complete, decodable image and only then
+# atomically renamed into place, so an interrupted run never leaves a
+# truncated image behind. Returns the size and SHA-256 hash of the file.
+def stream_to_file(response, image_dir, image_path):
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=image_dir, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                temp_file.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+        verify_image(temp_path)
+        os.replace(temp_path, image_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return size, digest.hexdigest()
+
+
+# Function to check that a downloaded file is a complete, decodable image.
+# JPEG files that start with the SOI marker must end with the EOI marker and
+# are decoded with PIL at reduced size, other images are checked with verify(),
+# so the memory of a check does not grow with the scan size.
+# Raises OSError when the check fails.
+def verify_image(path):
+    with open(path, 'rb') as file:
+        head = file.read(2)
+        if head == JPEG_SOI:
+            file.seek(0, os.SEEK_END)
+            file.seek(max(file.tell() - 1024, 0))
+            # Some encoders pad the file after the EOI marker
+            if not file.read().rstrip(b'\x00\r\n ').endswith(JPEG_EOI):
+                raise OSError(f"Truncated JPEG {path}: missing end of image marker")
+    try:
+        with PILImage.open(path) as img:
+            if img.format == 'JPEG':
+                # Decode at 1/8 scale: all entropy-coded data is still read and
+                # checked, but the raster held in memory is 64 times smaller
+                img.draft('RGB', (max(img.width // 8, 1), max(img.height // 8, 1)))
+                img.load()
+            else:
+                img.verify()
+    except Exception as e:
+        raise OSError(f"Undecodable image {path}: {e}") from e
+
+
+# Function to download many images with a bounded thread pool.
+# At most 2 * max_workers downloads are queued at any time, so the job list
+# may be a lazy generator over the whole hierarchy. With a manifest, completed
+# files are skipped and only missing, failed or partial files are fetched.
+# Returns the statistics of the run and the list of (url, image_path, error) failures.
+def download_images(jobs, max_workers=16, session=None, timeout=10, progress_every=100, manifest=None, revalidate=False):
+    if session is None:
+        session = make_session(pool_size=max_workers)
+
+    stats = {'files': 0, 'bytes': 0, 'skipped': 0, 'failed': 0, 'seconds': 0.0}
+    failures = []
+    lock = threading.Lock()
+    start_time = time.perf_counter()
+
+    def run_job(url, image_path):
+        job_start_time = time.perf_counter()
+        try:
+            status, size = download_image(session, url, image_path, timeout, manifest, revalidate)
+        except (requests.exceptions.RequestException, OSError) as e:
+            with lock:
+                stats['failed'] += 1
+                failures.append((url, image_path, str(e)))
+            print(f"Failed to download {url}: {e}")
+            return
+        if status != 'downloaded':
+            with lock:
+                stats['skipped'] += 1
+            return
+        metrics.record("download", time.perf_counter() - job_start_time, 1, size)
+        with lock:
+            stats['files'] += 1
+            stats['bytes'] += size
+            if progress_every and stats['files'] % progress_every == 0:
+                print_throughput(stats, time.perf_counter() - start_time)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for url, image_path in jobs:
+            if len(pending) >= 2 * max_workers:
+                _, pending = wait(pending, return_when=FIRST_COMPLETED)
+            pending.add(executor.submit(run_job, url, image_path))
+        wait(pending)
+
+    stats['seconds'] = time.perf_counter() - start_time
+    print_throughput(stats, stats['seconds'])
+    return stats, failures
+
+
+# Function to print the number of files and bytes downloaded per second
+def print_throughput(stats, seconds):
+    files_per_second = stats['files'] / seconds if seconds else 0.0
+    megabytes_per_second = stats['bytes'] / (1024 * 1024) / seconds if seconds else 0.0
+    print(f"Downloaded {stats['files']} images ({stats['bytes'] / (1024 * 1024):.1f} MiB, "
+          f"{stats['skipped']} up to date, {stats['failed']} failed) "
+          f"in {seconds:.1f}s: {files_per_second:.1f} images/s, {megabytes_per_second:.2f} MiB/s")
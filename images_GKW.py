@@ -1,47 +1,58 @@
-import pandas as pd
-import requests
 import os
-from concurrent.futures import ThreadPoolExecutor
-import shutil
+from image_download import download_images, DownloadManifest
+from crop_metadata import read_metadata
+from pipeline_metrics import metrics
 
 # Define the base URL and the local directory to save images
 BASE_URL = "http://nrw.wossidia.de/"
 LOCAL_DIR = "venv/downloaded_images"
 
+# The manifest records every finished download, so a rerun skips completed
+# files and only retries failed or partial ones
+MANIFEST_PATH = os.path.join(LOCAL_DIR, "download_manifest.jsonl")
+
+# Stage timings of the run are written to METRICS_PATH
+METRICS_PATH = os.path.join(LOCAL_DIR, "download_metrics.json")
+
 # Create the local directory if it doesn't exist
 os.makedirs(LOCAL_DIR, exist_ok=True)
 
 
-# Function to download an image
-def download_image(file_path):
-    url = BASE_URL + file_path
-    local_path = os.path.join(LOCAL_DIR, file_path.replace('/', '_'))
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        with open(local_path, 'wb') as file:
-            file.write(response.content)
-        print(f"Successfully downloaded {file_path}")
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to download {file_path}: {e}")
+# Function to build the download jobs of a metadata chunk as vectorized columns
+def image_jobs(df):
+    urls = BASE_URL + df['filepath']
+    local_paths = os.path.join(LOCAL_DIR, '') + df['filepath'].str.replace('/', '_', regex=False)
+    return zip(urls.tolist(), local_paths.tolist())
 
 
-# Function to read the CSV and start downloading images
-def download_images_from_csv(csv_file_path, start_index, num_images):
-    df = pd.read_csv(csv_file_path)
-    file_paths = df['filepath'].tolist()
+# Function to read only the filepath column in chunks and select the specified range of file paths
+def iter_image_jobs(csv_file_path, start_index=1, num_images=None, chunksize=50000):
+    end_index = None if num_images is None else start_index - 1 + num_images
+    for chunk in read_metadata(csv_file_path, columns=['filepath'], chunksize=chunksize):
+        selected = chunk.index >= start_index - 1
+        if end_index is not None:
+            selected &= chunk.index < end_index
+        yield from image_jobs(chunk[selected])
 
-    # Select the specified range of file paths
-    file_paths = file_paths[start_index - 1:start_index - 1 + num_images]
 
-    # Use ThreadPoolExecutor to download images concurrently
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        executor.map(download_image, file_paths)
+# Function to read the CSV and start downloading images.
+# By default every image in the CSV is synced; start_index (1-based) and
+# num_images still select a window of rows when needed.
+def download_images_from_csv(csv_file_path, start_index=1, num_images=None, revalidate=False):
+    # Download the images concurrently, skipping the ones already completed
+    with DownloadManifest(MANIFEST_PATH) as manifest:
+        return download_images(iter_image_jobs(csv_file_path, start_index, num_images), max_workers=10,
+                               manifest=manifest, revalidate=revalidate)
 
 
 # Provide the path to your CSV file
 csv_file_path = 'C:/Users/Ahmad-PC/Desktop/data-1720545468962.csv'  # Update this with your CSV file path
-download_images_from_csv(csv_file_path, start_index=1099, num_images=2000)
+stats, failures = download_images_from_csv(csv_file_path)
 
+if failures:
+    print(f"{len(failures)} images failed, rerun the script to retry them.")
+else:
+    print("Images downloaded successfully.")
 
-print("Images downloaded successfully.")
+metrics.report()
+metrics.write(METRICS_PATH)
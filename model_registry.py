@@ -0,0 +1,95 @@
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:  # Memory use is only reported when psutil is installed
+    psutil = None
+
+
+# Function to load the BERT NER pipeline from Hugging Face
+def load_bert(model_name):
+    from transformers import pipeline
+    return pipeline("ner", model=model_name, tokenizer=model_name, grouped_entities=True)
+
+
+# Function to load the BERT NER pipeline on a model exported to ONNX (see bert_onnx)
+def load_bert_onnx(model_dir):
+    from bert_onnx import load_bert_onnx as load_onnx_pipeline
+    return load_onnx_pipeline(model_dir)
+
+
+# Function to load a flair sequence tagger
+def load_flair(model_name):
+    from flair.models import SequenceTagger
+    return SequenceTagger.load(model_name)
+
+
+# Function to load a spaCy pipeline with only the components doc.ents needs
+def load_spacy(model_name):
+    import spacy
+    from spacy_batching import disable_unused_components
+    return disable_unused_components(spacy.load(model_name))
+
+
+# Loader of every backend, keyed by backend name
+BACKEND_LOADERS = {
+    "bert": load_bert,
+    "bert-onnx": load_bert_onnx,
+    "flair": load_flair,
+    "spacy": load_spacy
+}
+
+# Loaded models and their load statistics, keyed by (backend, model_name)
+_models = {}
+load_stats = {}
+_lock = threading.Lock()
+
+
+# Function to measure the resident memory of this process in bytes
+def _resident_memory():
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+# Function to return a model, loading it the first time it is requested.
+# Later calls with the same backend and model name reuse the loaded model,
+# so several runs in the same process pay the load cost only once.
+def get_model(backend, model_name):
+    key = (backend, model_name)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        if key not in _models:
+            memory_before = _resident_memory()
+            start_time = time.perf_counter()
+            _models[key] = BACKEND_LOADERS[backend](model_name)
+            load_seconds = time.perf_counter() - start_time
+            memory_after = _resident_memory()
+
+            load_stats[key] = {
+                'backend': backend,
+                'model': model_name,
+                'load_seconds': load_seconds,
+                'memory_bytes': memory_after - memory_before if memory_before is not None else None
+            }
+            print(f"Loaded {backend} model {model_name} in {load_seconds:.2f}s"
+                  f"{format_memory(load_stats[key]['memory_bytes'])}")
+        return _models[key]
+
+
+# Function to format a memory difference for the log lines
+def format_memory(memory_bytes):
+    if memory_bytes is None:
+        return ""
+    return f", {memory_bytes / (1024 * 1024):.1f} MiB"
+
+
+# Function to print the load time and memory use of every loaded model
+def report_models():
+    for stats in load_stats.values():
+        print(f"Model {stats['backend']}/{stats['model']}: loaded in {stats['load_seconds']:.2f}s"
+              f"{format_memory(stats['memory_bytes'])}")
@@ -0,0 +1,177 @@
+from model_registry import get_model
+from ner_cache import NERResultCache
+from bert_onnx import onnx_backend_name, onnx_model_path
+
+# Minimum score of the Flair and BERT entities that are kept
+SCORE_THRESHOLD = 0.955
+
+# spaCy entity labels that are kept
+SPACY_LABELS = ['PER', 'ORG', 'LOC', 'MISC']
+
+
+# Function to return the kept entities of a spaCy doc
+def spacy_entities(doc):
+    return [{'Type': ent.label_, 'Entity': ent.text, 'Position': ent.start_char}
+            for ent in doc.ents if ent.label_ in SPACY_LABELS]
+
+
+# Function to return the entities of the tagged Flair sentences of a text.
+# Span positions are relative to the sentence and shifted by its offset in the text.
+def flair_entities(sentences, threshold=SCORE_THRESHOLD):
+    return [{'Type': entity.get_label('ner').value, 'Entity': entity.text, 'Score': float(entity.score),
+             'Position': sentence.start_position + entity.start_position}
+            for sentence in sentences
+            for entity in sentence.get_spans('ner') if entity.score > threshold]
+
+
+# Function to return the entities of the grouped BERT pipeline results of a text.
+# Scores and offsets are converted from NumPy to plain numbers so they can be cached.
+def bert_entities(ner_results, threshold=SCORE_THRESHOLD):
+    return [{'Type': entity['entity_group'], 'Entity': entity['word'], 'Score': float(entity['score']),
+             'Position': int(entity['start'])}
+            for entity in ner_results if entity['score'] > threshold]
+
+
+# spaCy backend, only doc.ents of the NER component is used
+class SpacyBackend:
+    name = "spacy"
+    output_name = "SpaCy"
+    has_score = False
+    threshold = None
+
+    def __init__(self, model_name="de_core_news_sm", batch_size=50, model_revision=None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model_revision = model_revision
+
+    # Function to return the entities of every text as Type/Entity/Position dicts
+    def predict(self, texts):
+        nlp = get_model("spacy", self.model_name)
+        return [spacy_entities(doc) for doc in nlp.pipe(texts, batch_size=self.batch_size)]
+
+
+# Flair backend, tagging the sentences of all texts of a batch together
+class FlairBackend:
+    name = "flair"
+    output_name = "Flair"
+    # Texts are split into sentences, like the batched tagging of the Flair scripts
+    cache_name = "flair-sentences"
+    has_score = True
+
+    def __init__(self, model_name="flair/ner-german-large", mini_batch_size=32, threshold=SCORE_THRESHOLD,
+                 model_revision=None):
+        self.model_name = model_name
+        self.mini_batch_size = mini_batch_size
+        self.threshold = threshold
+        self.model_revision = model_revision
+
+    # Function to return the entities of every text as Type/Entity/Score/Position dicts
+    def predict(self, texts):
+        from flair_batching import tag_texts
+
+        tagger = get_model("flair", self.model_name)
+        return [flair_entities(sentences, self.threshold)
+                for sentences in tag_texts(tagger, texts, self.mini_batch_size)]
+
+
+# BERT backend, running the Hugging Face pipeline on the texts of a batch
+class BertBackend:
+    name = "bert"
+    output_name = "BERT"
+    has_score = True
+
+    def __init__(self, model_name="mschiesser/ner-bert-german", batch_size=8, threshold=SCORE_THRESHOLD,
+                 model_revision=None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.threshold = threshold
+        self.model_revision = model_revision
+
+    # Function to return the NER pipeline of the model
+    def pipeline(self):
+        return get_model("bert", self.model_name)
+
+    # Function to return the entities of every text as Type/Entity/Score/Position dicts
+    def predict(self, texts):
+        return [bert_entities(ner_results, self.threshold)
+                for ner_results in self.pipeline()(texts, batch_size=self.batch_size)]
+
+
+# BERT backend running the same pipeline on the model exported to ONNX and
+# executed by ONNX Runtime, by default with INT8 dynamic quantization.
+# The name includes the precision, so their cached entities are kept apart.
+class BertOnnxBackend(BertBackend):
+    output_name = "BERT-ONNX"
+
+    def __init__(self, model_name="mschiesser/ner-bert-german", batch_size=8, threshold=SCORE_THRESHOLD,
+                 model_revision=None, quantize=True):
+        super().__init__(model_name, batch_size, threshold, model_revision)
+        self.quantize = quantize
+        self.name = onnx_backend_name(quantize)
+
+    # Function to return the NER pipeline of the ONNX model, exporting it on first use
+    def pipeline(self):
+        return get_model("bert-onnx", onnx_model_path(self.model_name, self.quantize))
+
+
+# Backend class of every backend name
+BACKENDS = {
+    "spacy": SpacyBackend,
+    "flair": FlairBackend,
+    "bert": BertBackend,
+    "bert-onnx": BertOnnxBackend
+}
+
+
+# Function to return the name of the results of a backend, which keys its
+# cache and its checkpoints. Backends whose results depend on how they tag
+# name them with cache_name.
+def result_name(backend):
+    return getattr(backend, "cache_name", backend.name)
+
+
+# Function to open the result cache of a backend configuration
+def open_cache(backend, cache_path, connection=None):
+    return NERResultCache(cache_path, result_name(backend), backend.model_name, backend.model_revision,
+                          backend.threshold, connection)
+
+
+# Function to open the result caches of several backends on one cache file.
+# The caches share the connection of the first one, so their results do not
+# lock each other out; close them in reverse order. Returns a dict of
+# NERResultCache per backend name.
+def open_caches(backends, cache_path):
+    caches = {}
+    connection = None
+    for backend in backends:
+        caches[backend.name] = open_cache(backend, cache_path, connection)
+        connection = caches[backend.name].connection
+    return caches
+
+
+# Function to return the columns of the result rows of a backend
+def result_columns(id_columns, has_score):
+    return list(id_columns) + ['Type', 'Entity'] + (['Score'] if has_score else []) + ['Position', 'Distance']
+
+
+# Function to build the result rows of a document in the format of the NER scripts.
+# Dates come first with a score of 1.0, then the entities of the backend; the
+# Score column is left out for backends without scores, like the spaCy scripts.
+def build_rows(id_columns, id_values, dates, entities, has_score):
+    ids = dict(zip(id_columns, id_values))
+    rows = []
+    for date, start_pos, end_pos in dates:
+        row = {**ids, 'Type': 'DATE', 'Entity': date}
+        if has_score:
+            row['Score'] = 1.0
+        row['Position'] = start_pos
+        row['Distance'] = 0
+        rows.append(row)
+    for entity in entities:
+        row = {**ids, 'Type': entity['Type'], 'Entity': entity['Entity']}
+        if has_score:
+            row['Score'] = entity['Score']
+        row['Position'] = entity['Position']
+        row['Distance'] = 0
+        rows.append(row)
+    return rows
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import sqlite3
+from collections import deque
+from itertools import chain
+
+# Number of stored results after which the cache commits to disk
+COMMIT_EVERY = 500
+
+
+# Function to return the SHA-256 of a text, the content address of its results
+def text_sha(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+# On-disk cache of NER results in SQLite.
+# Results are the entity lists of the backends (Type/Entity/Score/Position
+# dicts), keyed by the SHA of the text together with the backend, the model
+# name and revision and the score threshold, so changing any of them misses
+# the cache instead of returning stale entities. One instance serves one
+# backend configuration; several configurations can share the same file.
+# Instances used together in one process must share one connection (pass the
+# connection of the first one), as SQLite locks the file while one connection
+# holds uncommitted results; a shared connection is closed by its opener.
+class NERResultCache:
+    def __init__(self, path, backend, model_name, model_revision=None, threshold=None, connection=None):
+        self.path = path
+        self.backend = backend
+        self.model_name = model_name
+        self.model_revision = model_revision
+        self.threshold = threshold
+        self.key = (backend, model_name, model_revision or '', '' if threshold is None else repr(float(threshold)))
+        self.hits = 0
+        self.misses = 0
+        self.pending = 0
+        self.owns_connection = connection is None
+        if connection is not None:
+            self.connection = connection
+            return
+
+        cache_dir = os.path.dirname(path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS ner_results ("
+            "text_sha TEXT NOT NULL, backend TEXT NOT NULL, model TEXT NOT NULL, revision TEXT NOT NULL, "
+            "threshold TEXT NOT NULL, entities TEXT NOT NULL, "
+            "PRIMARY KEY (text_sha, backend, model, revision, threshold))"
+        )
+        self.connection.commit()
+
+    # Function to return the cached entities of a text, or None on a miss
+    def get(self, text):
+        row = self.connection.execute(
+            "SELECT entities FROM ner_results WHERE text_sha = ? AND backend = ? AND model = ? "
+            "AND revision = ? AND threshold = ?",
+            (text_sha(text),) + self.key
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    # Function to store the entities of a text
+    def put(self, text, entities):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO ner_results VALUES (?, ?, ?, ?, ?, ?)",
+            (text_sha(text),) + self.key + (json.dumps(entities, ensure_ascii=False),)
+        )
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        self.connection.commit()
+        self.pending = 0
+
+    def close(self):
+        if self.connection is not None:
+            self.commit()
+            if self.owns_connection:
+                self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # Function to return the entities of a list of texts.
+    # predict is only called once, with the texts that missed the cache.
+    def predict(self, texts, predict):
+        results = [self.get(text) for text in texts]
+        missing = [index for index, entities in enumerate(results) if entities is None]
+        if missing:
+            for index, entities in zip(missing, predict([texts[index] for index in missing])):
+                self.put(texts[index], entities)
+                results[index] = entities
+        return results
+
+    # Function to run a streaming predictor on the documents that miss the cache.
+    # Documents are tuples whose last element is the text, and predict_stream
+    # takes an iterator of documents and yields (document, entities) pairs,
+    # like run_batched or pipe_documents. Cached documents are yielded as they
+    # are found, so the order of the pairs may differ from the corpus order.
+    def iter_cached(self, documents, predict_stream):
+        documents = iter(documents)
+        hits = deque()
+
+        def missing_documents():
+            for document in documents:
+                entities = self.get(document[-1])
+                if entities is None:
+                    yield document
+                else:
+                    hits.append((document, entities))
+
+        # Cached documents before the first miss are yielded directly, and the
+        # predictor is only started at the first miss, so a run whose texts
+        # are all cached does not load the model at all
+        for document in documents:
+            entities = self.get(document[-1])
+            if entities is not None:
+                yield document, entities
+                continue
+
+            for predicted_document, predicted_entities in predict_stream(chain([document], missing_documents())):
+                while hits:
+                    yield hits.popleft()
+                self.put(predicted_document[-1], predicted_entities)
+                yield predicted_document, predicted_entities
+            while hits:
+                yield hits.popleft()
+
+    # Function to print the hits and misses of this run
+    def report(self):
+        print(f"NER cache {self.backend}/{self.model_name}: {self.hits} hits, {self.misses} misses ({self.path})")
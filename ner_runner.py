@@ -0,0 +1,149 @@
+import argparse
+import os
+import time
+from corpus import DEFAULT_QUEUE_SIZE, LAYOUT_ID_COLUMNS, iter_documents, prefetch_documents
+from batched_inference import iter_batches
+from date_extraction import extract_dates
+from model_registry import report_models
+from ner_backends import BACKENDS, build_rows, open_caches, result_columns, result_name
+from result_writer import DEFAULT_FLUSH_EVERY, ResultWriter
+from pipeline_metrics import metrics, profile_block
+from word_distances import WordDistanceWriter
+
+
+# Function to walk the corpus once and run every backend on each batch of texts.
+# Dates (and optionally word distances) are computed once per document and
+# shared; the rows of each backend go to its ResultWriter in writers, keyed by
+# backend name. Documents finished by every output in an earlier run are
+# skipped, and each backend and the word distance writer only see the
+# documents they have not finished yet.
+# The corpus is read ahead by a background thread into a queue of queue_size
+# documents, or in this thread with a queue_size of 0. With caches, a dict of
+# NERResultCache per backend name, backends only see the texts that miss the
+# cache. Returns the number of processed documents.
+def run_backends(root_directory, layout, backends, writers, batch_size=32, word_distance_writer=None,
+                 queue_size=DEFAULT_QUEUE_SIZE, caches=None):
+    id_columns = LAYOUT_ID_COLUMNS[layout]
+    document_count = 0
+    start_time = time.perf_counter()
+
+    if queue_size:
+        corpus = prefetch_documents(root_directory, layout, queue_size)
+    else:
+        corpus = iter_documents(root_directory, layout)
+    documents = (
+        document for document in corpus
+        if not (all(writers[backend.name].is_done(document) for backend in backends)
+                and (word_distance_writer is None or word_distance_writer.is_done(document)))
+    )
+    for batch in iter_batches(documents, batch_size):
+        with metrics.stage("extract_dates", items=len(batch)):
+            batch_dates = [extract_dates(document[-1]) for document in batch]
+
+        for backend in backends:
+            writer = writers[backend.name]
+            pending = [(document, dates) for document, dates in zip(batch, batch_dates) if not writer.is_done(document)]
+            if not pending:
+                continue
+            texts = [document[-1] for document, dates in pending]
+            cache = caches.get(backend.name) if caches else None
+            with metrics.stage(f"inference_{backend.name}", items=len(texts)):
+                batch_entities = cache.predict(texts, backend.predict) if cache is not None else backend.predict(texts)
+            for (document, dates), entities in zip(pending, batch_entities):
+                writer.write(document, build_rows(id_columns, document[:-1], dates, entities, backend.has_score))
+
+        if word_distance_writer is not None:
+            pending = [document for document in batch if not word_distance_writer.is_done(document)]
+            with metrics.stage("word_distances", items=len(pending)):
+                for document in pending:
+                    word_distance_writer.write(dict(zip(id_columns, document[:-1])), document[-1])
+
+        document_count += len(batch)
+        elapsed = time.perf_counter() - start_time
+        print(f"Processed {document_count} documents in {elapsed:.2f}s "
+              f"({document_count / elapsed if elapsed else float('inf'):.2f} docs/s)")
+
+    return document_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several NER backends over one scan of a BKW or GKW corpus.")
+    parser.add_argument("root_directory", help="Corpus root with Brief/Blätter/*.txt (bkw) or Brief/*.txt (gkw)")
+    parser.add_argument("--layout", choices=sorted(LAYOUT_ID_COLUMNS), default="bkw")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=["spacy", "flair", "bert"],
+                        help="Backends to run; bert-onnx runs BERT with ONNX Runtime (INT8, exported on first use)")
+    # Not Ergebnisse, which holds the reference results of the earlier runs
+    parser.add_argument("--output-dir", default="results", help="Directory of the <Backend>-<LAYOUT>-Result.csv files")
+    parser.add_argument("--batch-size", type=int, default=32, help="Number of documents sent to the backends at once")
+    parser.add_argument("--word-distances", type=int, metavar="WINDOW", default=None,
+                        help="Also write word distances up to WINDOW words apart")
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Number of documents read ahead of the backends, 0 reads without a prefetch thread")
+    parser.add_argument("--cache", metavar="PATH", default=None,
+                        help="SQLite file caching the entities of every text, so reruns only tag changed texts")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Start the outputs over instead of skipping the documents of an earlier run")
+    parser.add_argument("--flush-every", type=int, default=DEFAULT_FLUSH_EVERY,
+                        help="Number of documents whose rows are buffered before they are written and checkpointed")
+    parser.add_argument("--metrics", metavar="PATH", default=None,
+                        help="JSON file of the stage timings, by default metrics-<LAYOUT>.json in the output directory")
+    parser.add_argument("--profile", choices=["cprofile", "py-spy"], default=None,
+                        help="Profile the inference loop and write the profile to the output directory")
+    args = parser.parse_args()
+    if args.prefetch < 0:
+        parser.error("--prefetch must be 0 or more")
+
+    backends = [BACKENDS[name]() for name in args.backends]
+    os.makedirs(args.output_dir, exist_ok=True)
+    layout_name = args.layout.upper()
+
+    # Open the result output of every backend, resuming after the documents of an earlier run
+    id_columns = LAYOUT_ID_COLUMNS[args.layout]
+    writers = {
+        backend.name: ResultWriter(os.path.join(args.output_dir, f"{backend.output_name}-{layout_name}-Result.csv"),
+                                   result_columns(id_columns, backend.has_score), resume=not args.no_resume,
+                                   flush_every=args.flush_every, run=f"{result_name(backend)}-{layout_name}").open()
+        for backend in backends
+    }
+
+    # Open the word distance output only when the feature is enabled
+    word_distance_writer = None
+    if args.word_distances is not None:
+        word_distance_output_path = os.path.join(args.output_dir, f"Word_Distances-{layout_name}.csv")
+        word_distance_writer = WordDistanceWriter(word_distance_output_path, id_columns, args.word_distances,
+                                                  resume=not args.no_resume, flush_every=args.flush_every,
+                                                  run=layout_name).open()
+
+    caches = {}
+    if args.cache is not None:
+        caches = open_caches(backends, args.cache)
+
+    finished = False
+    try:
+        profile_path = os.path.join(args.output_dir, f"inference-{layout_name}.{'prof' if args.profile == 'cprofile' else 'svg'}")
+        with profile_block(args.profile, profile_path):
+            run_backends(args.root_directory, args.layout, backends, writers, args.batch_size, word_distance_writer,
+                         args.prefetch, caches)
+        finished = True
+    finally:
+        # Write the rows of the last documents of every backend. Only a finished
+        # run is recorded as complete, an interrupted one resumes on the next run.
+        for backend in backends:
+            writers[backend.name].close(complete=finished)
+            print(f"{backend.output_name} NER results saved to {writers[backend.name].output_path} "
+                  f"({writers[backend.name].row_count} new rows)")
+        # The first cache owns the shared connection and is closed last
+        for cache in reversed(list(caches.values())):
+            cache.close()
+            cache.report()
+        if word_distance_writer is not None:
+            word_distance_writer.close(complete=finished)
+            print(f"Word distances saved to {word_distance_writer.output_path}")
+
+    report_models()
+    metrics.report()
+    metrics.write(args.metrics or os.path.join(args.output_dir, f"metrics-{layout_name}.json"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import cProfile
+import io
+import json
+import math
+import os
+import pstats
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency percentiles reported for every stage
+PERCENTILES = [50, 90, 99]
+
+# Seconds py-spy gets to write its profile before it is killed
+PY_SPY_STOP_TIMEOUT = 30
+
+
+# Timing of one pipeline stage: total wall time, items, bytes and the
+# per-item latency of every record, kept once per record with its item count
+class StageMetrics:
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.items = 0
+        self.bytes = 0
+        self.latencies = []
+
+    # Function to return the per-item latency at the given percentile, nearest
+    # rank, with every record counting as many times as it has items
+    def percentile(self, percent):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        rank = max(math.ceil(percent / 100 * sum(count for latency, count in ordered)), 1)
+        seen = 0
+        for latency, count in ordered:
+            seen += count
+            if seen >= rank:
+                return latency
+        return ordered[-1][0]
+
+    def to_dict(self):
+        return {
+            'seconds': self.seconds,
+            'items': self.items,
+            'bytes': self.bytes,
+            'items_per_second': self.items / self.seconds if self.seconds else None,
+            'bytes_per_second': self.bytes / self.seconds if self.seconds and self.bytes else None,
+            'latency_seconds': {f"p{percent}": self.percentile(percent) for percent in PERCENTILES}
+        }
+
+
+# Registry of the stage timings of a run.
+# Stages are recorded from any thread. Each record adds its wall time, item
+# count and bytes to the stage, and seconds / items as the latency of each of
+# its items, so a batch of n documents counts as n documents of equal latency.
+# The latency is stored once per record, not once per item.
+class PipelineMetrics:
+    def __init__(self):
+        self.stages = {}
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+
+    # Function to add a timing to a stage
+    def record(self, name, seconds, items=1, bytes=0):
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = StageMetrics(name)
+            stage.seconds += seconds
+            stage.items += items
+            stage.bytes += bytes
+            if items:
+                stage.latencies.append((seconds / items, items))
+
+    # Function to time a block as one record of a stage.
+    # The yielded dict can be updated with the 'items' and 'bytes' of the block.
+    @contextmanager
+    def stage(self, name, items=1, bytes=0):
+        counts = {'items': items, 'bytes': bytes}
+        start_time = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            self.record(name, time.perf_counter() - start_time, counts['items'], counts['bytes'])
+
+    # Function to time an iterable as the time spent waiting for its items.
+    # The waits of every batch_size consecutive items are recorded together.
+    # A producer that runs a model on a whole batch stalls on the first item
+    # and hands out the rest at once, so with its batch size every item gets
+    # its share of the batch time instead of the first item taking all of it.
+    # size returns the bytes of an item, if given.
+    def timed_iter(self, name, items, size=None, batch_size=1):
+        iterator = iter(items)
+        seconds = 0.0
+        count = 0
+        byte_count = 0
+        try:
+            while True:
+                start_time = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                seconds += time.perf_counter() - start_time
+                count += 1
+                byte_count += size(item) if size is not None else 0
+                if count >= batch_size:
+                    self.record(name, seconds, count, byte_count)
+                    seconds, count, byte_count = 0.0, 0, 0
+                yield item
+        finally:
+            if count:
+                self.record(name, seconds, count, byte_count)
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'wall_seconds': time.perf_counter() - self.start_time,
+                'stages': {name: stage.to_dict() for name, stage in self.stages.items()}
+            }
+
+    # Function to write the metrics of the run to a JSON file
+    def write(self, path):
+        metrics_dir = os.path.dirname(path)
+        if metrics_dir:
+            os.makedirs(metrics_dir, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, indent=2)
+        print(f"Metrics saved to {path}")
+
+    # Function to print a short summary of every stage
+    def report(self):
+        data = self.to_dict()
+        print(f"Stage timings ({data['wall_seconds']:.1f}s wall time):")
+        for name, stage in data['stages'].items():
+            line = f"  {name:<20} {stage['seconds']:>9.2f}s {stage['items']:>9} items"
+            if stage['items_per_second'] is not None:
+                line += f" {stage['items_per_second']:>10.1f}/s"
+            if stage['bytes']:
+                line += f" {stage['bytes'] / (1024 * 1024):>9.1f} MiB"
+            latency = stage['latency_seconds']
+            if latency['p50'] is not None:
+                line += "  latency " + " ".join(f"{key} {value * 1000:.1f}ms" for key, value in latency.items())
+            print(line)
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+            self.start_time = time.perf_counter()
+
+
+# Metrics of this process, shared by all modules of the pipeline
+metrics = PipelineMetrics()
+
+
+# Function to profile a block.
+# With "cprofile" the block runs under cProfile, the stats are dumped to
+# output_path and the top functions are printed. With "py-spy" a py-spy
+# sampler is attached to this process and writes a flame graph to output_path
+# when the block ends (py-spy must be installed and allowed to attach).
+# With None the block runs unchanged.
+@contextmanager
+def profile_block(profiler, output_path, top=20):
+    if profiler is None:
+        yield
+        return
+
+    if profiler == "cprofile":
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(output_path)
+            stream = io.StringIO()
+            pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(top)
+            print(stream.getvalue())
+            print(f"Profile saved to {output_path}")
+        return
+
+    if profiler == "py-spy":
+        executable = shutil.which("py-spy")
+        if executable is None:
+            print("py-spy is not installed, running without profiler")
+            yield
+            return
+        # py-spy writes its output when it is interrupted. Windows has no SIGINT
+        # for other processes, so there it runs in its own process group and
+        # gets a Ctrl+Break, which does not reach this process.
+        if os.name == "nt":
+            sampler = subprocess.Popen([executable, "record", "--pid", str(os.getpid()), "--output", output_path],
+                                       creationflags=subprocess.CREATE_NEW_PROCESS_GROUP)
+            stop_signal = signal.CTRL_BREAK_EVENT
+        else:
+            sampler = subprocess.Popen([executable, "record", "--pid", str(os.getpid()), "--output", output_path])
+            stop_signal = signal.SIGINT
+        try:
+            yield
+        finally:
+            sampler.send_signal(stop_signal)
+            try:
+                sampler.wait(timeout=PY_SPY_STOP_TIMEOUT)
+                print(f"Profile saved to {output_path}")
+            except subprocess.TimeoutExpired:
+                sampler.kill()
+                sampler.wait()
+                print(f"py-spy did not stop within {PY_SPY_STOP_TIMEOUT} seconds, no profile written")
+        return
+
+    raise ValueError(f"Unknown profiler {profiler!r}, use 'cprofile', 'py-spy' or None")
@@ -0,0 +1,182 @@
+import csv
+import json
+import os
+from ner_cache import text_sha
+from pipeline_metrics import metrics
+
+# Default number of documents whose rows are buffered before they are written
+DEFAULT_FLUSH_EVERY = 100
+
+
+# Function to return the checkpoint key of a document: its folder ids and the
+# SHA of its text, so several text files in the same folder are told apart
+def document_key(document):
+    return tuple(document[:-1]) + (text_sha(document[-1]),)
+
+
+# Checkpoint file of an output that is appended to document by document.
+# Each entry records the keys of a group of finished documents and the size
+# of the output once their rows were written and synced to disk. The first
+# entry also records the identity of the run (its columns, backend and layout),
+# so an output is only resumed by the same kind of run. A clean end of the run
+# adds a complete entry, so the next run starts the output over instead of
+# resuming it.
+class OutputCheckpoint:
+    def __init__(self, checkpoint_path, identity=None):
+        self.checkpoint_path = checkpoint_path
+        # Stored as JSON, so tuples compare equal to the lists read back
+        self.identity = json.loads(json.dumps(identity))
+        self.file = None
+
+    # Function to read the finished documents and the output size of the last
+    # checkpoint. Returns (None, empty set) when there is no run to resume, and
+    # raises ValueError when the unfinished run had another identity.
+    def read(self):
+        offset = None
+        done = set()
+        identity = None
+        if not os.path.exists(self.checkpoint_path):
+            return offset, done
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:  # Last line cut off by a crash
+                    break
+                if entry.get('complete'):
+                    return None, set()
+                if offset is None:
+                    identity = entry.get('identity')
+                done.update(tuple(key) for key in entry['documents'])
+                offset = entry['offset']
+        if offset is not None and identity != self.identity:
+            raise ValueError(f"{self.checkpoint_path} belongs to an unfinished run of {identity}, not {self.identity}; "
+                             f"use another output path or start over without resuming")
+        return offset, done
+
+    # Function to open the checkpoint, appending to it when a run is resumed
+    def open(self, resumed):
+        self.file = open(self.checkpoint_path, 'a' if resumed else 'w', encoding='utf-8')
+
+    # Function to record the output size after the given documents were written.
+    # The first entry of a new output is recorded with start.
+    def record(self, output_file, keys, complete=False, start=False):
+        output_file.flush()
+        os.fsync(output_file.fileno())
+        entry = {'offset': output_file.tell(), 'documents': [list(key) for key in keys]}
+        if start:
+            entry['identity'] = self.identity
+        if complete:
+            entry['complete'] = True
+        self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+# Function to open an output that is resumed from its checkpoint.
+# With resume and a checkpoint of an unfinished run, the output is cut back to
+# the last checkpointed size, so rows written after the last checkpoint are
+# not duplicated. Returns the output file opened for appending, or None when
+# the output has to be started over, and the documents that are done.
+def open_resumed(output_path, checkpoint, resume):
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    offset, done = None, set()
+    if resume and os.path.exists(output_path):
+        offset, done = checkpoint.read()
+    if offset is None:
+        checkpoint.open(resumed=False)
+        return None, set()
+
+    # Drop the rows written after the last checkpoint
+    with open(output_path, 'r+b') as file:
+        file.truncate(offset)
+    checkpoint.open(resumed=True)
+    print(f"Resuming {output_path}: {len(done)} documents already done")
+    return open(output_path, 'a', newline='', encoding='utf-8'), done
+
+
+# Writer that appends the result rows of finished documents to a CSV file.
+# Rows are buffered for flush_every documents, written and flushed to disk,
+# and then the keys of those documents are appended to the checkpoint file
+# together with the size of the output. When a run is restarted with resume,
+# the output is cut back to the last checkpointed size and is_done reports
+# the finished documents so they can be skipped. Only a run with the same
+# fieldnames and run name (the backend and layout) resumes the output. close
+# with complete marks the run as finished, so the next run writes the output
+# from scratch.
+class ResultWriter:
+    def __init__(self, output_path, fieldnames, checkpoint_path=None, resume=True,
+                 flush_every=DEFAULT_FLUSH_EVERY, run=None):
+        self.output_path = output_path
+        self.fieldnames = list(fieldnames)
+        self.checkpoint_path = checkpoint_path if checkpoint_path is not None else output_path + ".checkpoint.jsonl"
+        self.resume = resume
+        self.flush_every = flush_every
+        self.done = set()
+        self.buffered_rows = []
+        self.buffered_keys = []
+        self.row_count = 0
+        self.file = None
+        self.writer = None
+        self.checkpoint = OutputCheckpoint(self.checkpoint_path, {'fieldnames': self.fieldnames, 'run': run})
+
+    def open(self):
+        self.file, self.done = open_resumed(self.output_path, self.checkpoint, self.resume)
+        if self.file is None:
+            self.file = open(self.output_path, 'w', newline='', encoding='utf-8')
+            self.writer = csv.DictWriter(self.file, fieldnames=self.fieldnames)
+            self.writer.writeheader()
+            self.checkpoint.record(self.file, [], start=True)
+        else:
+            self.writer = csv.DictWriter(self.file, fieldnames=self.fieldnames)
+        return self
+
+    # Function to check whether a document was finished by an earlier run
+    def is_done(self, document):
+        return document_key(document) in self.done
+
+    # Function to add the rows of a finished document
+    def write(self, document, rows):
+        self.buffered_rows.extend(rows)
+        self.buffered_keys.append(document_key(document))
+        if len(self.buffered_keys) >= self.flush_every:
+            self.flush()
+
+    # Function to write the buffered rows and checkpoint their documents
+    def flush(self):
+        if not self.buffered_keys:
+            return
+        with metrics.stage("write_results", items=len(self.buffered_rows)) as counts:
+            start_offset = self.file.tell()
+            self.writer.writerows(self.buffered_rows)
+            self.checkpoint.record(self.file, self.buffered_keys)
+            counts['bytes'] = self.file.tell() - start_offset
+        self.row_count += len(self.buffered_rows)
+        self.done.update(self.buffered_keys)
+        self.buffered_rows = []
+        self.buffered_keys = []
+
+    # Function to write the last rows and close the output.
+    # With complete the run is recorded as finished; without it, as after an
+    # error, the next run resumes after the last checkpoint.
+    def close(self, complete=False):
+        if self.file is not None:
+            self.flush()
+            if complete:
+                self.checkpoint.record(self.file, [], complete=True)
+            self.file.close()
+            self.checkpoint.close()
+            self.file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(complete=exc_type is None)
@@ -0,0 +1,35 @@
+import time
+
+# Components that may feed the NER component through a listener
+EMBEDDING_COMPONENTS = ["tok2vec", "transformer"]
+
+
+# Function to disable every pipeline component that doc.ents does not need.
+# The NER component is kept, plus a shared embedding component only when the
+# NER component listens to it.
+def disable_unused_components(nlp):
+    enabled = ["ner"]
+    for name in EMBEDDING_COMPONENTS:
+        if name in nlp.pipe_names and "ner" in getattr(nlp.get_pipe(name), "listening_components", []):
+            enabled.append(name)
+    nlp.select_pipes(enable=[name for name in nlp.pipe_names if name in enabled])
+    return nlp
+
+
+# Function to stream documents through nlp.pipe.
+# Documents are tuples whose last element is the text; the tuple travels
+# with the text as context so every Doc keeps its Brief ID/Blätter ID.
+# Yields (document, doc) pairs and reports the throughput at the end.
+def pipe_documents(nlp, documents, batch_size=50, n_process=1, report=True):
+    start_time = time.perf_counter()
+    total_documents = 0
+    stream = ((document[-1], document) for document in documents)
+    for doc, document in nlp.pipe(stream, as_tuples=True, batch_size=batch_size, n_process=n_process):
+        total_documents += 1
+        yield document, doc
+
+    elapsed = time.perf_counter() - start_time
+    if report and total_documents:
+        print(f"Processed {total_documents} documents in {elapsed:.2f}s "
+              f"({total_documents / elapsed if elapsed else float('inf'):.2f} docs/s, "
+              f"batch size {batch_size}, {n_process} processes)")
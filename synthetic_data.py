@@ -0,0 +1,116 @@
+import json
+import os
+import random
+
+# Words the synthetic transcriptions are made of
+WORDS = [
+    "Brief", "Herr", "Frau", "Rostock", "Schwerin", "Wismar", "Güstrow", "Mecklenburg", "Pastor", "Lehrer",
+    "Sage", "Märchen", "Lied", "Dorf", "Hof", "Kirche", "Schule", "und", "der", "die", "das", "mit", "von",
+    "nach", "bei", "ich", "Sie", "habe", "wurde", "erzählt", "gesammelt", "geschrieben", "Wossidlo", "Richard",
+    "Johann", "Maria", "Friedrich", "Bauer", "Knecht", "Schäfer", "Müller", "Abend", "Winter", "Sommer"
+]
+
+# Month spellings matched by date_extraction
+DATE_MONTHS = ["3", "12", "IV", "XI", "Jan", "Mär", "Juli", "Okt", "Dezember"]
+
+# Share of the words of a text that are replaced by a date
+DATE_RATE = 0.01
+
+# Levels of the WossiDiA node dumps and the at_bkw file of each
+DUMP_FILES = {
+    "person": "at_bkw0.json",
+    "letters": "at_bkw1.json",
+    "sheets": "at_bkw2.json",
+    "pages": "at_bkw3.json"
+}
+
+
+# Function to return a random date in one of the formats of date_extraction
+def make_date(rng):
+    year = rng.choice([str(rng.randint(1880, 1939)), f"{rng.randint(0, 99):02d}"])
+    return f"{rng.randint(1, 28)}.{rng.choice(['', ' '])}{rng.choice(DATE_MONTHS)}.{rng.choice(['', ' '])}{year}"
+
+
+# Function to return a synthetic transcription of the given number of words
+def make_text(rng, word_count):
+    words = [make_date(rng) if rng.random() < DATE_RATE else rng.choice(WORDS) for _ in range(word_count)]
+    lines = [" ".join(words[start:start + 12]) for start in range(0, len(words), 12)]
+    return "\n".join(lines)
+
+
+# Function to write a synthetic corpus in the BKW (Brief/Blätter/*.txt) or
+# GKW (Brief/*.txt) layout. Returns the number of text files written.
+def write_corpus(root_directory, layout="bkw", brief_count=20, blätter_per_brief=5, words_per_text=300, seed=0):
+    rng = random.Random(seed)
+    file_count = 0
+    for brief_index in range(brief_count):
+        brief_path = os.path.join(root_directory, f"Brief_{brief_index:05d}")
+        folders = [brief_path]
+        if layout == "bkw":
+            folders = [os.path.join(brief_path, f"Blatt_{blatt_index:03d}") for blatt_index in range(blätter_per_brief)]
+
+        for folder in folders:
+            os.makedirs(folder, exist_ok=True)
+            with open(os.path.join(folder, "transcription.txt"), 'w', encoding='utf-8') as file:
+                file.write(make_text(rng, words_per_text))
+            file_count += 1
+    return file_count
+
+
+# Function to return one API item of a node list
+def make_item(rng, node_id, level_name, parent_id):
+    return {
+        'id': node_id,
+        'signature': f"{level_name}/{node_id}",
+        'attributes': {
+            'parent': parent_id,
+            'sig3': f"BKW {node_id}",
+            'imagedigital': str(rng.randint(10 ** 8, 10 ** 9)) if level_name == "pages" else None,
+            'wossig': f"W{node_id}",
+            'info2': [{'key': "Ort", 'value': rng.choice(WORDS)}, {'key': "digitalisiert", 'value': None}]
+        }
+    }
+
+
+# Function to build the node lists of the four WossiDiA levels with the given
+# number of children per node. Returns {level_name: {'result': [items]}}, the
+# shape of the at_bkw0 - at_bkw3 responses.
+def make_node_dumps(person_count=50, letters_per_person=10, sheets_per_letter=3, pages_per_sheet=2, seed=0):
+    rng = random.Random(seed)
+    counts = {"letters": letters_per_person, "sheets": sheets_per_letter, "pages": pages_per_sheet}
+    next_id = 1
+    parent_ids = [None]
+    dumps = {}
+    for level_name in DUMP_FILES:
+        items = []
+        for parent_id in parent_ids:
+            for _ in range(person_count if parent_id is None else counts[level_name]):
+                items.append(make_item(rng, next_id, level_name, parent_id))
+                next_id += 1
+        dumps[level_name] = {'result': items}
+        parent_ids = [item['id'] for item in items]
+    return dumps
+
+
+# Function to write the node lists as at_bkw0.json - at_bkw3.json.
+# Returns the path of every level, like wossidia_api.fetch_all_paths.
+def write_node_dumps(directory, dumps):
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for level_name, data in dumps.items():
+        paths[level_name] = os.path.join(directory, DUMP_FILES[level_name])
+        with open(paths[level_name], 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False)
+    return paths
+
+
+# Function to write a synthetic scan of the given size
+def make_sample_image(path, width=3000, height=4000):
+    from PIL import Image as PILImage
+
+    img = PILImage.new('RGB', (width, height))
+    pixels = img.load()
+    for y in range(0, height, 16):
+        for x in range(0, width, 16):
+            pixels[x, y] = ((x * 7) % 256, (y * 3) % 256, ((x + y) * 5) % 256)
+    img.save(path, quality=90)
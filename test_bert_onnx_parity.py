@@ -0,0 +1,68 @@
+import os
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("optimum.onnxruntime")
+
+from bert_onnx import QUANTIZED_FILE_NAME, onnx_model_path
+from bert_onnx_parity import (
+    FP32_MIN_AGREEMENT, FP32_SCORE_TOLERANCE, INT8_MIN_AGREEMENT, INT8_SCORE_TOLERANCE, agreement,
+    build_tiny_model, compare_runtimes, compare_with_reference, synthetic_documents
+)
+from model_registry import get_model
+from ner_backends import SCORE_THRESHOLD
+
+
+# Tiny local BERT model, built once for all tests of this module
+@pytest.fixture(scope="module")
+def tiny_model(tmp_path_factory):
+    return build_tiny_model(str(tmp_path_factory.mktemp("tiny-bert")))
+
+
+@pytest.fixture(scope="module")
+def documents():
+    return synthetic_documents(20)
+
+
+@pytest.fixture(scope="module")
+def onnx_dir(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("onnx"))
+
+
+def test_fp32_export_matches_pytorch(tiny_model, documents, onnx_dir):
+    onnx_pipeline = get_model("bert-onnx", onnx_model_path(tiny_model, False, onnx_dir))
+
+    totals, torch_results, onnx_results = compare_runtimes(get_model("bert", tiny_model), onnx_pipeline, documents)
+
+    assert totals['matched'] > 0
+    assert agreement(totals) >= FP32_MIN_AGREEMENT
+    assert totals['max_score_difference'] <= FP32_SCORE_TOLERANCE
+
+
+def test_int8_model_matches_pytorch(tiny_model, documents, onnx_dir):
+    onnx_pipeline = get_model("bert-onnx", onnx_model_path(tiny_model, True, onnx_dir))
+
+    totals, torch_results, onnx_results = compare_runtimes(get_model("bert", tiny_model), onnx_pipeline, documents)
+
+    assert totals['matched'] > 0
+    assert agreement(totals) >= INT8_MIN_AGREEMENT
+    assert totals['max_score_difference'] <= INT8_SCORE_TOLERANCE
+
+    # The PyTorch entities above the score threshold serve as the result CSV of an earlier run
+    reference = {ids: [entity for entity in entities if entity['Score'] > SCORE_THRESHOLD]
+                 for ids, entities in torch_results.items()}
+    reference_totals, compared = compare_with_reference(reference, onnx_results)
+    assert compared == len(documents)
+    assert reference_totals['matched'] > 0
+    assert agreement(reference_totals) >= INT8_MIN_AGREEMENT
+
+
+def test_fp32_export_directory_is_quantized_in_place(tiny_model, onnx_dir):
+    fp32_dir = onnx_model_path(tiny_model, False, onnx_dir)
+
+    quantized_dir = onnx_model_path(fp32_dir, True, onnx_dir)
+
+    assert quantized_dir == os.path.join(fp32_dir, "int8")
+    assert os.path.isfile(os.path.join(quantized_dir, QUANTIZED_FILE_NAME))
+    assert onnx_model_path(fp32_dir, True, onnx_dir) == quantized_dir
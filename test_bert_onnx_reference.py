@@ -0,0 +1,42 @@
+import os
+import zipfile
+import pytest
+
+pytest.importorskip("pandas")
+
+from bert_onnx_parity import read_reference
+
+ARCHIVE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Ergebnisse.zip")
+
+
+# Result CSVs of the earlier runs, extracted from the shipped archive
+@pytest.fixture(scope="module")
+def results_dir(tmp_path_factory):
+    if not os.path.exists(ARCHIVE_PATH):
+        pytest.skip("Ergebnisse.zip is not shipped with this checkout")
+    extract_dir = tmp_path_factory.mktemp("ergebnisse")
+    with zipfile.ZipFile(ARCHIVE_PATH) as archive:
+        archive.extractall(extract_dir)
+    return extract_dir / "Ergebnisse"
+
+
+@pytest.mark.parametrize("file_name, layout", [
+    ("BERT-BKW-Result.csv", "bkw"), ("BERT-GKW-Result.csv", "gkw"), ("BKW-Flair.csv", "bkw"), ("GKW-Flair.csv", "gkw")
+])
+def test_shipped_results_are_read_as_reference(results_dir, file_name, layout):
+    reference = read_reference(str(results_dir / file_name), layout)
+
+    assert reference
+    for ids, entities in reference.items():
+        assert len(ids) == (2 if layout == "bkw" else 1)
+        for entity in entities:
+            assert entity['Type'] != 'DATE'
+            assert 0.0 <= entity['Score'] <= 1.0 and entity['Position'] >= 0
+
+
+@pytest.mark.parametrize("file_name, layout", [
+    ("SpaCy-BKW-Result.csv", "bkw"), ("BERT-BKW-Result.csv", "gkw"), ("BERT-GKW-Result.csv", "bkw")
+])
+def test_unusable_reference_is_rejected(results_dir, file_name, layout):
+    with pytest.raises(ValueError):
+        read_reference(str(results_dir / file_name), layout)
@@ -0,0 +1,138 @@
+import io
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from PIL import Image as PILImage
+from image_download import DownloadManifest, bkw_image_jobs, download_images
+
+
+# Function to return the bytes of a small JPEG of one colour
+def make_jpeg(colour):
+    buffer = io.BytesIO()
+    PILImage.new('RGB', (32, 24), colour).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+# Page hierarchy of one person with two letters, in the shape of build_hierarchy
+def make_hierarchy():
+    return [{
+        'id': 1,
+        'letters': [
+            {'id': 10, 'sheets': [{'id': 100, 'pages': [{'imagedigital': '255'}, {'imagedigital': '4096'}]}]},
+            {'id': 11, 'sheets': [{'id': 110, 'pages': [{'imagedigital': '48879'}, {'imagedigital': None}]}]}
+        ]
+    }]
+
+
+# Local stand-in for the digipool, serving /{hex}/working from a dict of scans
+@pytest.fixture
+def image_server():
+    scans = {'ff': make_jpeg('red'), '1000': make_jpeg('green'), 'beef': make_jpeg('blue')}
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_seen.append(self.path)
+            hex_value, _, suffix = self.path.strip('/').partition('/')
+            body = scans.get(hex_value) if suffix == 'working' else None
+            if body is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', f'"{hex_value}"')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield {
+            'url_template': f"http://127.0.0.1:{server.server_address[1]}/{{hex_value}}/working",
+            'scans': scans,
+            'requests': requests_seen
+        }
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_download_images_keeps_layout_and_reports_throughput(tmp_path, image_server):
+    image_root = str(tmp_path / "images")
+    jobs = bkw_image_jobs(make_hierarchy(), image_root, image_server['url_template'])
+
+    stats, failures = download_images(jobs, max_workers=2)
+
+    scans = image_server['scans']
+    expected = {
+        os.path.join(image_root, "10", "100", "ff.jpg"): scans['ff'],
+        os.path.join(image_root, "10", "100", "1000.jpg"): scans['1000'],
+        os.path.join(image_root, "11", "110", "beef.jpg"): scans['beef']
+    }
+    for image_path, body in expected.items():
+        with open(image_path, 'rb') as file:
+            assert file.read() == body
+    assert sorted(os.listdir(os.path.join(image_root, "11", "110"))) == ["beef.jpg"]
+
+    assert failures == []
+    assert stats['files'] == 3
+    assert stats['bytes'] == sum(len(body) for body in expected.values())
+    assert stats['skipped'] == 0 and stats['failed'] == 0
+    assert stats['seconds'] > 0
+
+
+def test_download_images_reports_missing_scans(tmp_path, image_server):
+    image_path = str(tmp_path / "images" / "1" / "2" / "abc.jpg")
+    url = image_server['url_template'].format(hex_value="abc")
+
+    stats, failures = download_images([(url, image_path)], max_workers=1)
+
+    assert stats['files'] == 0 and stats['failed'] == 1
+    assert [(failed_url, failed_path) for failed_url, failed_path, error in failures] == [(url, image_path)]
+    assert not os.path.exists(image_path)
+    assert not [name for name in os.listdir(os.path.dirname(image_path)) if name.endswith('.part')]
+
+
+def test_rerun_with_manifest_skips_completed_files(tmp_path, image_server):
+    image_root = str(tmp_path / "images")
+    manifest_path = str(tmp_path / "manifest.jsonl")
+    with DownloadManifest(manifest_path) as manifest:
+        download_images(bkw_image_jobs(make_hierarchy(), image_root, image_server['url_template']), manifest=manifest)
+    requests_before = len(image_server['requests'])
+
+    with DownloadManifest(manifest_path) as manifest:
+        stats, failures = download_images(bkw_image_jobs(make_hierarchy(), image_root, image_server['url_template']),
+                                          manifest=manifest)
+
+    assert stats['files'] == 0 and stats['skipped'] == 3
+    assert len(image_server['requests']) == requests_before
+
+
+def test_existing_files_seed_the_manifest(tmp_path, image_server):
+    image_root = str(tmp_path / "images")
+    scans = image_server['scans']
+    intact_path = os.path.join(image_root, "10", "100", "ff.jpg")
+    truncated_path = os.path.join(image_root, "10", "100", "1000.jpg")
+    os.makedirs(os.path.dirname(intact_path))
+    with open(intact_path, 'wb') as file:
+        file.write(scans['ff'])
+    with open(truncated_path, 'wb') as file:
+        file.write(scans['1000'][:len(scans['1000']) // 2])
+
+    with DownloadManifest(str(tmp_path / "manifest.jsonl")) as manifest:
+        stats, failures = download_images(bkw_image_jobs(make_hierarchy(), image_root, image_server['url_template']),
+                                          manifest=manifest)
+        assert manifest.is_complete(intact_path)
+        assert manifest.get(intact_path)['size'] == len(scans['ff'])
+
+    # The intact file is taken over, the truncated one is fetched again
+    assert sorted(image_server['requests']) == ["/1000/working", "/beef/working"]
+    assert stats['files'] == 2 and stats['skipped'] == 1
+    with open(truncated_path, 'rb') as file:
+        assert file.read() == scans['1000']
@@ -0,0 +1,69 @@
+import csv
+import ner_cache
+from corpus import LAYOUT_ID_COLUMNS
+from ner_backends import open_caches, result_columns
+from ner_runner import run_backends
+from result_writer import ResultWriter
+
+
+# Stand-in backend tagging the first word of every text, counting the texts it sees
+class FakeBackend:
+    has_score = True
+    threshold = 0.5
+    model_revision = None
+
+    def __init__(self, name):
+        self.name = name
+        self.output_name = name
+        self.model_name = f"fake/{name}"
+        self.texts = []
+
+    def predict(self, texts):
+        self.texts.extend(texts)
+        return [[{'Type': self.name, 'Entity': text.split()[0], 'Score': 0.9, 'Position': 0}] for text in texts]
+
+
+# Function to write a GKW corpus of one text file per Brief folder
+def make_corpus(root, count):
+    for index in range(count):
+        brief = root / f"{index:03d}"
+        brief.mkdir(parents=True)
+        (brief / "brief.txt").write_text(f"Text{index} aus Rostock", encoding='utf-8')
+
+
+# Function to run the backends over the corpus into output_dir, with one cache file for all of them
+def run(root, output_dir, cache_path, backends):
+    writers = {backend.name: ResultWriter(str(output_dir / f"{backend.name}.csv"),
+                                          result_columns(LAYOUT_ID_COLUMNS['gkw'], backend.has_score),
+                                          resume=False).open()
+               for backend in backends}
+    caches = open_caches(backends, str(cache_path))
+    try:
+        run_backends(str(root), "gkw", backends, writers, batch_size=4, queue_size=0, caches=caches)
+    finally:
+        for writer in writers.values():
+            writer.close(complete=True)
+        for cache in reversed(list(caches.values())):
+            cache.close()
+    return writers
+
+
+def test_backends_share_one_cache_file(tmp_path, monkeypatch):
+    # Keep every result of the run uncommitted, so a second connection to the file would be locked out
+    monkeypatch.setattr(ner_cache, "COMMIT_EVERY", 10 ** 6)
+    root = tmp_path / "corpus"
+    make_corpus(root, 10)
+    cache_path = tmp_path / "cache.sqlite"
+
+    backends = [FakeBackend("first"), FakeBackend("second")]
+    writers = run(root, tmp_path / "run1", cache_path, backends)
+
+    for backend in backends:
+        assert len(backend.texts) == 10
+        with open(writers[backend.name].output_path, newline='', encoding='utf-8') as file:
+            assert [row['Type'] for row in csv.DictReader(file)] == [backend.name] * 10
+
+    # A rerun finds the results of both backends in the cache
+    backends = [FakeBackend("first"), FakeBackend("second")]
+    run(root, tmp_path / "run2", cache_path, backends)
+    assert [backend.texts for backend in backends] == [[], []]
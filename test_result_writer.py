@@ -0,0 +1,59 @@
+import csv
+import pytest
+from result_writer import ResultWriter
+
+FIELDNAMES = ['Brief ID', 'Entity']
+
+
+# Documents of one Brief folder each, in the (id, text) shape of the GKW corpus
+def make_documents(count):
+    return [(f"{index:03d}", f"Text {index}") for index in range(count)]
+
+
+# Function to return the two result rows of a document
+def make_rows(document):
+    return [{'Brief ID': document[0], 'Entity': f"{document[1]} {part}"} for part in ("a", "b")]
+
+
+def read_rows(output_path):
+    with open(output_path, newline='', encoding='utf-8') as file:
+        return list(csv.DictReader(file))
+
+
+def test_resume_after_interrupted_flush_writes_every_row_once(tmp_path):
+    output_path = str(tmp_path / "Result.csv")
+    documents = make_documents(10)
+
+    writer = ResultWriter(output_path, FIELDNAMES, flush_every=3, run="test-GKW").open()
+    for document in documents[:7]:
+        writer.write(document, make_rows(document))
+    # The run dies while flushing document 6: its rows reach the output, its checkpoint entry does not
+    writer.writer.writerows(writer.buffered_rows)
+    writer.file.close()
+    writer.checkpoint.close()
+
+    writer = ResultWriter(output_path, FIELDNAMES, flush_every=3, run="test-GKW").open()
+    assert [document for document in documents if writer.is_done(document)] == documents[:6]
+    for document in documents:
+        if not writer.is_done(document):
+            writer.write(document, make_rows(document))
+    writer.close(complete=True)
+
+    assert read_rows(output_path) == [row for document in documents for row in make_rows(document)]
+
+
+def test_output_of_another_run_is_not_resumed(tmp_path):
+    output_path = str(tmp_path / "Result.csv")
+    writer = ResultWriter(output_path, FIELDNAMES, flush_every=1, run="bert-GKW").open()
+    writer.write(("000", "Text"), make_rows(("000", "Text")))
+    writer.close()
+
+    with pytest.raises(ValueError):
+        ResultWriter(output_path, FIELDNAMES, run="spacy-GKW").open()
+    with pytest.raises(ValueError):
+        ResultWriter(output_path, FIELDNAMES + ['Score'], run="bert-GKW").open()
+
+    # Starting over without resuming replaces the output
+    writer = ResultWriter(output_path, FIELDNAMES, resume=False, run="spacy-GKW").open()
+    writer.close(complete=True)
+    assert read_rows(output_path) == []
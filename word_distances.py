@@ -0,0 +1,116 @@
+import csv
+import numpy as np
+from ner_cache import text_sha
+from result_writer import DEFAULT_FLUSH_EVERY, OutputCheckpoint, document_key, open_resumed
+
+# Default number of words to the right that are paired with each word
+DEFAULT_MAX_WINDOW = 10
+
+
+# Function to calculate word distances lazily.
+# Instead of materializing every combinations() pair, the pairs are produced
+# one distance at a time as NumPy position arrays: for a distance d the
+# first positions are 0..n-d-1 and the second positions are shifted by d.
+# A max_window of None pairs every word with every other word.
+def calculate_word_distances(text, max_window=DEFAULT_MAX_WINDOW):
+    words = text.split()
+    return words, iter_word_distances(len(words), max_window)
+
+
+# Function to yield (first_positions, second_positions, distance) per distance
+def iter_word_distances(word_count, max_window=DEFAULT_MAX_WINDOW):
+    largest_distance = word_count - 1 if max_window is None else min(max_window, word_count - 1)
+    for distance in range(1, largest_distance + 1):
+        first_positions = np.arange(word_count - distance)
+        yield first_positions, first_positions + distance, distance
+
+
+# Writer for the separate word distance output.
+# Rows are appended per document, so nothing is kept in memory between texts.
+# Every flush_every documents the output is synced and the documents are
+# recorded in a checkpoint next to it, like the ResultWriter of the results.
+# With resume, an unfinished earlier output is cut back to its last checkpoint
+# and the documents recorded there are skipped, so no rows are written twice.
+# Only a run with the same id columns, run name and max_window resumes it.
+class WordDistanceWriter:
+    def __init__(self, output_path, id_columns, max_window=DEFAULT_MAX_WINDOW, checkpoint_path=None, resume=False,
+                 flush_every=DEFAULT_FLUSH_EVERY, run=None):
+        self.output_path = output_path
+        self.id_columns = list(id_columns)
+        self.max_window = max_window
+        self.checkpoint_path = checkpoint_path if checkpoint_path is not None else output_path + ".checkpoint.jsonl"
+        self.resume = resume
+        self.flush_every = flush_every
+        self.done = set()
+        self.pending_keys = []
+        self.file = None
+        self.writer = None
+        self.checkpoint = OutputCheckpoint(self.checkpoint_path, {'fieldnames': self.id_columns, 'run': run,
+                                                                  'max_window': max_window})
+
+    # Function to open the output file and write the header, or to reopen the
+    # output of an unfinished earlier run with resume
+    def open(self):
+        self.file, self.done = open_resumed(self.output_path, self.checkpoint, self.resume)
+        if self.file is None:
+            self.file = open(self.output_path, 'w', newline='', encoding='utf-8')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(self.id_columns + ['Entity', 'Position', 'Distance'])
+            self.checkpoint.record(self.file, [], start=True)
+        else:
+            self.writer = csv.writer(self.file)
+        return self
+
+    # Function to check whether the word distances of a document were written
+    def is_done(self, document):
+        return document_key(document) in self.done
+
+    # Function to checkpoint the documents written since the last checkpoint
+    def flush(self):
+        if self.pending_keys:
+            self.checkpoint.record(self.file, self.pending_keys)
+            self.done.update(self.pending_keys)
+            self.pending_keys = []
+
+    # Function to close the output, with complete recording the run as finished
+    def close(self, complete=False):
+        if self.file is not None:
+            self.flush()
+            if complete:
+                self.checkpoint.record(self.file, [], complete=True)
+            self.file.close()
+            self.checkpoint.close()
+            self.file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(complete=exc_type is None)
+
+    # Function to write the word distances of one text.
+    # Documents already written by an earlier run are skipped.
+    def write(self, ids, text):
+        id_values = [ids[column] for column in self.id_columns]
+        key = tuple(id_values) + (text_sha(text),)
+        if key in self.done:
+            return 0
+        self.pending_keys.append(key)
+        rows = self.write_rows(id_values, text)
+        if len(self.pending_keys) >= self.flush_every:
+            self.flush()
+        return rows
+
+    # Function to write the word distance rows of one text
+    def write_rows(self, id_values, text):
+        words, pairs = calculate_word_distances(text, self.max_window)
+        if not words:
+            return 0
+        words = np.array(words, dtype=object)
+        rows = 0
+        for first_positions, second_positions, distance in pairs:
+            entities = words[first_positions] + '-' + words[second_positions]
+            self.writer.writerows(id_values + [entity, position, distance]
+                                  for entity, position in zip(entities, first_positions.tolist()))
+            rows += len(first_positions)
+        return rows
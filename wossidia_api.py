@@ -0,0 +1,141 @@
+import os
+import re
+import json
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from pipeline_metrics import metrics
+
+try:
+    import ijson
+except ImportError:  # Without ijson the node lists are parsed in one piece
+    ijson = None
+
+# Size of the chunks a response is streamed to the cache in
+CHUNK_SIZE = 1024 * 1024
+
+# List of URLs to fetch JSON data from
+NODE_URLS = {
+    "person": "https://api.wossidia.de/nodes/at_bkw0",
+    "letters": "https://api.wossidia.de/nodes/at_bkw1",
+    "sheets": "https://api.wossidia.de/nodes/at_bkw2",
+    "pages": "https://api.wossidia.de/nodes/at_bkw3"
+}
+
+# Directory the raw API responses are cached in
+DEFAULT_CACHE_DIR = "api_cache"
+
+
+# Function to return the cache file of a URL and the file of its validators
+def cache_paths(url, cache_dir):
+    name = re.sub(r'[^A-Za-z0-9_.-]', '_', url.rstrip('/').rsplit('/', 1)[-1])
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]
+    base_path = os.path.join(cache_dir, f"{name}-{digest}")
+    return base_path + ".json", base_path + ".meta.json"
+
+
+# Function to read the validators and fetch time of a cached response
+def read_cache_meta(meta_path):
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+# Function to write a file atomically, so an interrupted run never leaves a partial cache
+def write_atomic(path, data):
+    temp_path = f"{path}.{os.getpid()}.part"
+    with open(temp_path, 'wb') as file:
+        file.write(data)
+    os.replace(temp_path, path)
+
+
+# Function to write chunks to a file atomically, without holding the whole body in memory
+def write_stream_atomic(path, chunks):
+    temp_path = f"{path}.{os.getpid()}.part"
+    try:
+        with open(temp_path, 'wb') as file:
+            for chunk in chunks:
+                file.write(chunk)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+# Function to return the path of the raw response of a URL, refreshing the cache if needed.
+# A cached response younger than ttl seconds is used without a request. Older
+# ones are revalidated with If-None-Match/If-Modified-Since and kept on a 304.
+# In offline mode only the cache is used. When the request fails, a cached
+# response is used instead of failing the run.
+def fetch_to_cache(url, cache_dir=DEFAULT_CACHE_DIR, ttl=None, offline=False, timeout=60, session=None):
+    os.makedirs(cache_dir, exist_ok=True)
+    data_path, meta_path = cache_paths(url, cache_dir)
+    meta = read_cache_meta(meta_path) if os.path.exists(data_path) else None
+
+    if offline:
+        if meta is None:
+            raise FileNotFoundError(f"No cached response for {url} in {cache_dir} (offline mode)")
+        return data_path
+
+    if meta is not None and ttl is not None and time.time() - meta['fetched_at'] < ttl:
+        return data_path
+
+    headers = {}
+    if meta is not None:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    try:
+        with (session or requests).get(url, headers=headers, timeout=timeout, stream=True) as response:
+            if response.status_code == 304 and meta is not None:
+                meta['fetched_at'] = time.time()
+                write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+                return data_path
+            response.raise_for_status()  # Ensure we notice bad responses
+            write_stream_atomic(data_path, response.iter_content(chunk_size=CHUNK_SIZE))
+    except requests.exceptions.RequestException as e:
+        if meta is None:
+            raise
+        print(f"Failed to refresh {url}, using cached response: {e}")
+        return data_path
+
+    write_atomic(meta_path, json.dumps({
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'fetched_at': time.time()
+    }).encode('utf-8'))
+    return data_path
+
+
+# Function to iterate over the 'result' items of a cached node list.
+# With ijson the file is parsed incrementally, so only one item is held in
+# memory at a time instead of the raw text and the whole parsed tree.
+def iter_result_items(data_path):
+    with open(data_path, 'rb') as file:
+        if ijson is not None:
+            yield from ijson.items(file, 'result.item', use_float=True)
+        else:
+            yield from json.load(file)['result']
+
+
+# Function to fetch a URL into the cache, timed as the fetch stage with the size of the response
+def fetch_to_cache_timed(url, **kwargs):
+    with metrics.stage("fetch") as counts:
+        data_path = fetch_to_cache(url, **kwargs)
+        counts['bytes'] = os.path.getsize(data_path)
+    return data_path
+
+
+# Fetch all URLs concurrently into the cache and return the path of every level
+def fetch_all_paths(urls=NODE_URLS, **kwargs):
+    with ThreadPoolExecutor() as executor:
+        futures = {level_name: executor.submit(fetch_to_cache_timed, url, **kwargs) for level_name, url in urls.items()}
+        return {level_name: future.result() for level_name, future in futures.items()}
+
@@ -0,0 +1,102 @@
+# Shared helpers for the WossiDiA person/letter/sheet/page tree (at_bkw0 - at_bkw3)
+
+# Levels of the hierarchy from the root down to the pages
+LEVELS = ["person", "letters", "sheets", "pages"]
+
+# Level that holds the children of each level
+NEXT_LEVEL = {
+    "person": "letters",
+    "letters": "sheets",
+    "sheets": "pages"
+}
+
+# Key of the children at each depth of the tree, precomputed for the traversal
+CHILD_KEYS = [NEXT_LEVEL[level_name] for level_name in LEVELS[:-1]]
+
+
+# Function to extract the fields we use from a single API item
+def process_item(item, level_name):
+    attributes = item['attributes']
+    return {
+        'id': item.get('id'),
+        'signature': item.get('signature'),
+        'type': level_name,
+        'parent': attributes.get('parent'),
+        'sig3': attributes.get('sig3'),
+        'imagedigital': attributes.get('imagedigital'),
+        'wossig': attributes.get('wossig'),
+        'info2': ', '.join([f"{info['key']}: {info['value']}" if info['value'] else info['key'] for info in attributes.get('info2', [])])
+    }
+
+
+# Function to index a stream of raw API items of every level by their id.
+# Each item goes through the process_item field extraction straight into the
+# index, so no list of raw or processed items is built on the way.
+def index_node_items(level_items):
+    hierarchy = {level_name: {} for level_name in LEVELS}
+    for level_name, items in level_items.items():
+        nodes = hierarchy[level_name]
+        for item in items:
+            node = process_item(item, level_name)
+            nodes[node['id']] = node
+    return hierarchy
+
+
+# Function to connect the levels of the hierarchy in a single pass per level.
+# Children are grouped by their 'parent' attribute once, so every node is
+# visited a constant number of times instead of once per possible parent.
+# Returns the list of person nodes and the orphan nodes of every level whose
+# parent is missing from the level above.
+def build_hierarchy(hierarchy):
+    orphans = {}
+    for parent_level, child_level in NEXT_LEVEL.items():
+        children_by_parent = {}
+        for node in hierarchy[child_level].values():
+            children_by_parent.setdefault(node['parent'], []).append(node)
+
+        parents = hierarchy[parent_level]
+        for node_id, node in parents.items():
+            node[child_level] = children_by_parent.get(node_id, [])
+
+        orphans[child_level] = [
+            node
+            for parent_id, children in children_by_parent.items()
+            if parent_id not in parents
+            for node in children
+        ]
+
+    full_hierarchy = list(hierarchy["person"].values())
+    return full_hierarchy, orphans
+
+
+# Function to walk the tree iteratively and yield (person, letter, sheet, page) tuples.
+# An explicit stack of child iterators replaces the recursion, and the
+# ancestors are kept in one shared path list instead of being copied per level.
+# The nodes are yielded as they are, without building any context dicts.
+def iter_pages(full_hierarchy):
+    path = [None] * len(CHILD_KEYS)
+    last_depth = len(CHILD_KEYS) - 1
+    stack = [iter(full_hierarchy)]
+    while stack:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+            continue
+
+        depth = len(stack) - 1
+        path[depth] = node
+        if depth == last_depth:
+            person, letter = path[0], path[1]
+            for page in node.get(CHILD_KEYS[depth], ()):
+                yield person, letter, node, page
+        else:
+            stack.append(iter(node.get(CHILD_KEYS[depth], ())))
+
+
+# Function to print how many nodes of each level could not be attached
+def report_orphans(orphans):
+    for level_name, nodes in orphans.items():
+        if nodes:
+            parent_ids = sorted({str(node['parent']) for node in nodes})
+            print(f"{len(nodes)} orphan {level_name} nodes with missing parent: {', '.join(parent_ids[:10])}"
+                  f"{' ...' if len(parent_ids) > 10 else ''}")